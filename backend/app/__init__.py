@@ -3,6 +3,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import os
 
+from app import log
+from app.cache import response_cache
+from app.pubsub import broker
+
 db = SQLAlchemy()
 
 
@@ -14,9 +18,18 @@ def create_app():
 
     # 推迟导入模型，确保 db 已初始化
     from app import models  # noqa: F401
+    from app import principal
+    from app.services import password_service, like_service, deletion_service
 
     # 初始化扩展
     db.init_app(app)
+    response_cache.init_app(app)
+    broker.init_app(app)
+    log.init_app(app)
+    principal.init_app(app)
+    password_service.init_app(app)
+    like_service.init_app(app)
+    deletion_service.init_app(app)
     CORS(app, resources={r"/api/*": {"origins": "https://tfms.forum.dcpstudios.top"}}, supports_credentials=True)
 
     # 注册蓝图（后续在各模块中补充）
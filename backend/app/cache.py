@@ -0,0 +1,255 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, session, jsonify, make_response
+
+
+class MemoryBackend:
+    """进程内缓存：带 TTL 和按字节数上限的 LRU 淘汰"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at, tags)
+        self._tags = {}  # tag -> set(key)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl, tags=()):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl, tuple(tags))
+            self.size += len(value)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[0])
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    """多进程共享的缓存，兼容 Redis 协议（TCP 或 unix:// 本地套接字）
+
+    淘汰策略和内存上限由服务端的 maxmemory / maxmemory-policy 控制。
+    """
+
+    def __init__(self, url, prefix='tfms:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl, tags=()):
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, value, ex=ttl)
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, ttl * 2)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            tag_key = self.prefix + 'tag:' + tag
+            keys = self.client.smembers(tag_key)
+            pipe = self.client.pipeline()
+            for key in keys:
+                pipe.delete(self.prefix + key.decode())
+            pipe.delete(tag_key)
+            pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+    """读接口的响应缓存，值为可 JSON 序列化的数据，按标签失效"""
+
+    def __init__(self):
+        self.backend = None
+        self.default_ttl = 60
+
+    def init_app(self, app):
+        backend = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 60)
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['RESPONSE_CACHE_URL'])
+        else:
+            self.backend = None
+
+    def get(self, key):
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, data, tags=(), ttl=None):
+        if self.backend is None:
+            return
+        # 默认转义非 ASCII 字符，字符数即字节数，便于按内存上限淘汰
+        value = json.dumps(data, separators=(',', ':'))
+        self.backend.set(key, value, ttl or self.default_ttl, tags)
+
+    def invalidate(self, *tags):
+        if self.backend is not None and tags:
+            self.backend.invalidate(tags)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+response_cache = ResponseCache()
+
+
+def request_cache_key():
+    """按接口路径和排序后的查询参数生成缓存键
+
+    空值参数也计入键：例如帖子列表的 cursor= 表示启用游标分页，与不传 cursor 的响应格式不同。
+    """
+    args = sorted(request.args.items(multi=True))
+    return f'{request.path}?{urlencode(args)}'
+
+
+def cached_json(tags, ttl=None, anonymous_only=True):
+    """缓存返回 JSON 的 GET 接口，只缓存 200 响应
+
+    tags 为 tags(data, **view_args)，返回该响应关联的失效标签；
+    anonymous_only 为 True 时已登录用户的请求不走缓存（响应中含个人数据）。
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if anonymous_only and 'user_id' in session:
+                return func(*args, **kwargs)
+
+            key = request_cache_key()
+            data = response_cache.get(key)
+            if data is not None:
+                return jsonify(data)
+
+            response = func(*args, **kwargs)
+            if getattr(response, 'status_code', None) == 200 and response.is_json:
+                data = response.get_json()
+                response_cache.set(key, data, tags(data, **kwargs), ttl)
+            return response
+        return wrapper
+    return decorator
+
+
+def make_etag(parts):
+    """由校验数据生成 ETag"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def is_not_modified(etag, last_modified=None):
+    """判断条件请求是否命中；有 If-None-Match 时忽略 If-Modified-Since"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified=None, max_age=0, public=False, per_user=False):
+    """写入 ETag、Last-Modified 和 Cache-Control 响应头
+
+    public 为 True 时浏览器和反向代理都可缓存 max_age 秒；否则只允许浏览器缓存且每次需重新验证。
+    per_user 表示响应内容随登录用户变化，需要按 Cookie 区分。
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    if public:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    if per_user:
+        response.vary.add('Cookie')
+    return response
+
+
+def conditional_json(validator=None, max_age=0, per_user=True):
+    """为 GET 接口加上 ETag / Last-Modified 条件请求支持
+
+    validator(**view_args) 只做轻量查询，返回 (校验数据, 最后修改时间)，命中时直接返回 304，不执行接口本身。
+    不传 validator 或其返回 None 时，ETag 由实际返回的响应体计算：与 cached_json 叠加使用时，
+    缓存命中的请求不查数据库即可返回 304，ETag 也始终与返回的（可能稍旧的）缓存内容一致。
+    per_user 的接口只有匿名请求可被共享缓存。
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            public = not per_user or 'user_id' not in session
+            result = validator(**kwargs) if validator is not None else None
+            if result is None:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                etag = make_etag(response.get_data())
+                if is_not_modified(etag):
+                    response = make_response('', 304)
+                return set_validators(response, etag, None, max_age, public, per_user)
+
+            parts, last_modified = result
+            etag = make_etag(parts)
+            if is_not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return set_validators(response, etag, last_modified, max_age, public, per_user)
+        return wrapper
+    return decorator
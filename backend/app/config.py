@@ -11,5 +11,76 @@ class Config:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # 热度后台重新衰减的间隔（秒），0 表示不启动后台线程
+    HOT_SCORE_DECAY_INTERVAL = int(os.environ.get("TFMSFORUM_HOT_SCORE_DECAY_INTERVAL", 600))
+
+    # 浏览数缓冲刷新的间隔（秒）和缓冲帖子数上限
+    VIEW_FLUSH_INTERVAL = int(os.environ.get("TFMSFORUM_VIEW_FLUSH_INTERVAL", 5))
+    VIEW_FLUSH_THRESHOLD = int(os.environ.get("TFMSFORUM_VIEW_FLUSH_THRESHOLD", 500))
+
+    # 读接口响应缓存：memory（进程内）、redis（多进程共享，URL 可为 unix:// 套接字）或 none
+    RESPONSE_CACHE_BACKEND = os.environ.get("TFMSFORUM_RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_URL = os.environ.get("TFMSFORUM_RESPONSE_CACHE_URL", "redis://localhost:6379/0")
+    RESPONSE_CACHE_TTL = int(os.environ.get("TFMSFORUM_RESPONSE_CACHE_TTL", 60))
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("TFMSFORUM_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # 登录用户身份缓存：条目数上限和有效期（秒），多进程部署时权限变更最多延迟这么久生效
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get("TFMSFORUM_PRINCIPAL_CACHE_SIZE", 10000))
+    PRINCIPAL_CACHE_TTL = int(os.environ.get("TFMSFORUM_PRINCIPAL_CACHE_TTL", 60))
+
+    # 用户点赞集合缓存：内存上限（字节）、有效期（秒）和单个用户可缓存的点赞数上限
+    LIKE_CACHE_MAX_BYTES = int(os.environ.get("TFMSFORUM_LIKE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    LIKE_CACHE_TTL = int(os.environ.get("TFMSFORUM_LIKE_CACHE_TTL", 300))
+    LIKE_CACHE_MAX_PER_USER = int(os.environ.get("TFMSFORUM_LIKE_CACHE_MAX_PER_USER", 100000))
+
+    # 删除帖子和用户：从属数据不超过 DELETE_SYNC_LIMIT 行时在请求中直接删除，
+    # 否则先软删除，再由后台任务每批 DELETE_BATCH_SIZE 行分批清理
+    DELETE_SYNC_LIMIT = int(os.environ.get("TFMSFORUM_DELETE_SYNC_LIMIT", 1000))
+    DELETE_BATCH_SIZE = int(os.environ.get("TFMSFORUM_DELETE_BATCH_SIZE", 500))
+
+    # 密码哈希进程池：进程数（0 表示在请求线程中计算）、排队上限和单次等待超时（秒）
+    PASSWORD_HASH_WORKERS = int(os.environ.get("TFMSFORUM_PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get("TFMSFORUM_PASSWORD_HASH_MAX_PENDING", 8))
+    PASSWORD_HASH_TIMEOUT = int(os.environ.get("TFMSFORUM_PASSWORD_HASH_TIMEOUT", 10))
+
+    # 通知推送：pub/sub 后端 memory（单进程）或 redis（多进程广播），SSE 心跳间隔、长轮询等待时间（秒）和每进程连接上限
+    PUBSUB_BACKEND = os.environ.get("TFMSFORUM_PUBSUB_BACKEND", "memory")
+    PUBSUB_URL = os.environ.get("TFMSFORUM_PUBSUB_URL", "redis://localhost:6379/0")
+    NOTIFICATION_STREAM_HEARTBEAT = int(os.environ.get("TFMSFORUM_NOTIFICATION_STREAM_HEARTBEAT", 15))
+    NOTIFICATION_POLL_TIMEOUT = int(os.environ.get("TFMSFORUM_NOTIFICATION_POLL_TIMEOUT", 25))
+    NOTIFICATION_STREAM_MAX_CONNECTIONS = int(os.environ.get("TFMSFORUM_NOTIFICATION_STREAM_MAX_CONNECTIONS", 1000))
+
+    # 后台任务：Web 进程内的工作线程数（0 表示只由 run_jobs.py 执行）和轮询间隔（秒）
+    JOB_WORKERS = int(os.environ.get("TFMSFORUM_JOB_WORKERS", 2))
+    JOB_POLL_INTERVAL = float(os.environ.get("TFMSFORUM_JOB_POLL_INTERVAL", 1))
+
+    # 日志：目录、格式（text 或 json）、队列容量、单文件大小上限、是否按进程分文件、是否同时输出到控制台
+    LOG_DIR = os.environ.get("TFMSFORUM_LOG_DIR", ".")
+    LOG_FORMAT = os.environ.get("TFMSFORUM_LOG_FORMAT", "text")
+    LOG_QUEUE_SIZE = int(os.environ.get("TFMSFORUM_LOG_QUEUE_SIZE", 10000))
+    LOG_MAX_BYTES = int(os.environ.get("TFMSFORUM_LOG_MAX_BYTES", 50 * 1024 * 1024))
+    LOG_PER_PROCESS = os.environ.get("TFMSFORUM_LOG_PER_PROCESS", "0") == "1"
+    LOG_ECHO = os.environ.get("TFMSFORUM_LOG_ECHO", "1") == "1"
+
+    # 图片上传：存储目录、单个文件大小上限（字节）和返回给前端的 URL 前缀
+    UPLOAD_FOLDER = os.environ.get(
+        "TFMSFORUM_UPLOAD_FOLDER",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "upload"),
+    )
+    UPLOAD_MAX_BYTES = int(os.environ.get("TFMSFORUM_UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_URL_PREFIX = os.environ.get("TFMSFORUM_UPLOAD_URL_PREFIX", "https://tfms.fback.dcpstudios.top/api/upload")
+    # 图片发送方式：direct（由 Flask 发送）、x-accel（Nginx 的 X-Accel-Redirect）或 x-sendfile（Apache/Lighttpd），
+    # x-accel 模式下 UPLOAD_ACCEL_PREFIX 为 Nginx 中映射到上传目录的 internal location
+    UPLOAD_DELIVERY = os.environ.get("TFMSFORUM_UPLOAD_DELIVERY", "direct")
+    UPLOAD_ACCEL_PREFIX = os.environ.get("TFMSFORUM_UPLOAD_ACCEL_PREFIX", "/internal-uploads/")
+    # 未引用图片的清理：修改时间在宽限期（秒）内的文件不删除，每秒最多删除的文件数，
+    # 被拒绝的帖子超过保留期（秒，空为永久保留）后其引用的图片也可以清理
+    UPLOAD_GC_GRACE = int(os.environ.get("TFMSFORUM_UPLOAD_GC_GRACE", 24 * 3600))
+    UPLOAD_GC_RATE = int(os.environ.get("TFMSFORUM_UPLOAD_GC_RATE", 50))
+    UPLOAD_GC_REJECTED_RETENTION = (
+        int(os.environ["TFMSFORUM_UPLOAD_GC_REJECTED_RETENTION"])
+        if os.environ.get("TFMSFORUM_UPLOAD_GC_REJECTED_RETENTION") else None
+    )
+
     # 以后可以在这里扩展更多配置，如分页大小、上传目录等
 
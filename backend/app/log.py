@@ -1,7 +1,203 @@
+import atexit
+import json
+import os
+import queue
+import threading
 import time
-def log(message):
-    print(time.strftime("[%H:%M:%S] ", time.localtime()) + message)
-    f = open(f"log-{time.strftime('%Y-%m-%d' , time.localtime())}.txt", "a")
-    f.write(time.strftime("[%H:%M:%S] ", time.localtime()) + message + "\n")
-    f.close()
-    return
\ No newline at end of file
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只能使用按进程分文件
+    fcntl = None
+
+from flask import g, has_request_context, session
+
+
+class LogWriter:
+    """异步日志写入器
+
+    请求线程只把记录放进有界队列，后台线程批量取出后用缓冲 I/O 写盘。
+    队列满时直接丢弃新记录并计数，保证日志永远不会阻塞请求。
+    """
+
+    def __init__(self, directory='.', fmt='text', queue_size=10000, batch_size=500,
+                 flush_interval=1.0, max_bytes=50 * 1024 * 1024, per_process=False, echo=True):
+        self.directory = directory
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        # 没有 fcntl 时无法跨进程加锁，退化为每个进程写自己的文件
+        self.per_process = per_process or fcntl is None
+        self.echo = echo
+
+        self.stats = {'enqueued': 0, 'written': 0, 'dropped': 0, 'errors': 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+        self._file = None
+        self._path = None
+
+    def submit(self, record):
+        """放入一条记录，队列满时丢弃，不阻塞调用方"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            self.stats['enqueued'] += 1
+        except queue.Full:
+            self.stats['dropped'] += 1
+
+    def close(self):
+        """停止后台线程并写完队列中剩余的记录"""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping = True
+        thread.join(timeout=5)
+        self._thread = None
+        self._stopping = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._drain()
+            if batch:
+                try:
+                    self._write(batch)
+                    self.stats['written'] += len(batch)
+                except OSError:
+                    self.stats['errors'] += 1
+            elif self._stopping:
+                return
+
+    def _drain(self):
+        """等待第一条记录，然后尽量多取，最多 batch_size 条"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _format(self, record):
+        if self.fmt == 'json':
+            return json.dumps(record, ensure_ascii=False, default=str)
+        return time.strftime('[%H:%M:%S] ', time.localtime(record['ts'])) + record['message']
+
+    def _write(self, batch):
+        lines = [self._format(record) for record in batch]
+        if self.echo:
+            print('\n'.join(lines), flush=True)
+
+        handle = self._open(batch[-1]['ts'])
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        if fcntl is not None and not self.per_process:
+            # 多进程共用同一个文件时，整批写入期间持有排他锁
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                handle.write(data)
+                handle.flush()
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        else:
+            handle.write(data)
+            handle.flush()
+
+    def _open(self, ts):
+        """按日期和大小轮转，返回当前应写入的文件"""
+        name = f"log-{time.strftime('%Y-%m-%d', time.localtime(ts))}"
+        if self.per_process:
+            name += f'-{os.getpid()}'
+        path = os.path.join(self.directory, name + ('.jsonl' if self.fmt == 'json' else '.txt'))
+
+        if self._file is not None and self._path == path:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is None or stat.st_ino != os.fstat(self._file.fileno()).st_ino:
+                # 文件已被其他进程轮转
+                self._file.close()
+                self._file = None
+            elif self.max_bytes and stat.st_size >= self.max_bytes:
+                self._file.close()
+                self._file = None
+                self._rotate(path)
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file = open(path, 'ab', buffering=64 * 1024)
+            self._path = path
+        return self._file
+
+    def _rotate(self, path):
+        # 多进程共用文件时可能已被其他进程轮转，重命名失败直接忽略
+        index = 1
+        while os.path.exists(f'{path}.{index}'):
+            index += 1
+        try:
+            os.rename(path, f'{path}.{index}')
+        except OSError:
+            pass
+
+
+writer = LogWriter()
+
+
+def init_app(app):
+    """根据配置重建日志写入器，并记录每个请求的开始时间用于计算耗时"""
+    global writer
+    writer.close()
+    writer = LogWriter(
+        directory=app.config.get('LOG_DIR', '.'),
+        fmt=app.config.get('LOG_FORMAT', 'text'),
+        queue_size=app.config.get('LOG_QUEUE_SIZE', 10000),
+        max_bytes=app.config.get('LOG_MAX_BYTES', 50 * 1024 * 1024),
+        per_process=app.config.get('LOG_PER_PROCESS', False),
+        echo=app.config.get('LOG_ECHO', True),
+    )
+
+    @app.before_request
+    def _mark_request_start():
+        g.request_started = time.perf_counter()
+
+
+def log(message, **fields):
+    """记录一条日志，可附带 action、post_id 等结构化字段
+
+    在请求上下文中会自动补充当前用户 id 和请求已耗时（毫秒）。
+    """
+    record = {'ts': time.time(), 'pid': os.getpid(), 'message': message}
+    if has_request_context():
+        record['user_id'] = session.get('user_id')
+        started = g.get('request_started')
+        if started is not None:
+            record['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    record.update(fields)
+    writer.submit(record)
+
+
+def log_stats():
+    """日志队列的计数：已入队、已写入、丢弃和写入错误次数"""
+    return dict(writer.stats, queued=writer._queue.qsize())
+
+
+atexit.register(lambda: writer.close())
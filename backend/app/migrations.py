@@ -0,0 +1,264 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from app.models import (
+    Comment, CommentLike, Job, Notification, Post, PostHotScore, PostLike,
+    SearchDocument, SearchPosting, UploadReference, User,
+)
+from app import db
+from app.services import ranking_service
+
+# 已执行的迁移，每个版本一行；init_db.py 新建的库直接记为最新版本
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, primary_key=True),
+    db.Column("description", db.String(200), nullable=False),
+    db.Column("applied_at", db.DateTime, nullable=False),
+)
+
+Migration = namedtuple("Migration", "version description func follow_up")
+
+# 按版本号排序的迁移列表
+MIGRATIONS = []
+
+
+def migration(version, description, follow_up=None):
+    """注册一个迁移，函数接收数据库连接
+
+    迁移只做增量修改（加表、加列、加索引），不删除数据。MySQL 的 DDL 会隐式提交，
+    所以每一步都先检查对象是否已存在，中途失败后重新运行即可继续。
+    follow_up 为迁移后建议运行的脚本，由 migrate.py 输出提示。
+    """
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, description, func, follow_up))
+        MIGRATIONS.sort(key=lambda item: item.version)
+        return func
+    return decorator
+
+
+def add_column(conn, column, default=None):
+    """给已有表加上模型中声明的列，列已存在时返回 False"""
+    table = column.table.name
+    if column.name in {item["name"] for item in inspect(conn).get_columns(table)}:
+        return False
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.execute(text(ddl))
+    return True
+
+
+def create_table(conn, model):
+    """按模型建表（连同其索引），表已存在时跳过"""
+    model.__table__.create(conn, checkfirst=True)
+
+
+def create_index(conn, model, name):
+    """创建模型中声明的索引，索引已存在时跳过"""
+    table = model.__table__
+    if name in {item["name"] for item in inspect(conn).get_indexes(table.name)}:
+        return False
+    next(index for index in table.indexes if index.name == name).create(conn)
+    return True
+
+
+@migration(1, "冗余计数列：帖子评论数/点赞数、评论点赞数、用户未读通知数")
+def add_counter_columns(conn):
+    if add_column(conn, Post.__table__.c.comments_count, default=0):
+        conn.execute(text(
+            "UPDATE posts SET comments_count = "
+            "(SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+        ))
+    if add_column(conn, Post.__table__.c.likes_count, default=0):
+        conn.execute(text(
+            "UPDATE posts SET likes_count = "
+            "(SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id)"
+        ))
+    if add_column(conn, Comment.__table__.c.likes_count, default=0):
+        conn.execute(text(
+            "UPDATE comments SET likes_count = "
+            "(SELECT COUNT(*) FROM comment_likes WHERE comment_likes.comment_id = comments.id)"
+        ))
+    if add_column(conn, User.__table__.c.unread_notifications_count, default=0):
+        conn.execute(text(
+            "UPDATE users SET unread_notifications_count = "
+            "(SELECT COUNT(*) FROM notifications "
+            "WHERE notifications.user_id = users.id AND notifications.is_read = :false)"
+        ), {"false": False})
+
+
+@migration(2, "热度表和全文检索表", follow_up="python rebuild_search_index.py")
+def add_ranking_and_search_tables(conn):
+    create_table(conn, PostHotScore)
+    # sort=hot 只列出有热度行的帖子，建表后立即按计数列为已有帖子补建
+    conn.execute(ranking_service.backfill_statement(conn.dialect.name))
+    create_table(conn, SearchDocument)
+    create_table(conn, SearchPosting)
+
+
+@migration(3, "通知收件箱索引")
+def add_notification_indexes(conn):
+    create_index(conn, Notification, "ix_notifications_user_read_created")
+    create_index(conn, Notification, "ix_notifications_user_created")
+
+
+@migration(4, "后台任务表")
+def add_jobs_table(conn):
+    create_table(conn, Job)
+
+
+@migration(5, "帖子正文渲染缓存列", follow_up="python render_posts.py")
+def add_render_cache_columns(conn):
+    add_column(conn, Post.__table__.c.content_rendered)
+    add_column(conn, Post.__table__.c.rendered_hash)
+
+
+@migration(6, "上传文件引用表", follow_up="python upload_gc.py --reindex")
+def add_upload_references_table(conn):
+    create_table(conn, UploadReference)
+
+
+@migration(7, "帖子列表、评论列表和点赞的复合索引，点赞唯一约束")
+def add_listing_indexes_and_like_constraints(conn):
+    create_index(conn, Post, "ix_posts_status_created")
+    create_index(conn, Post, "ix_posts_category_status_created")
+    create_index(conn, Comment, "ix_comments_post_created")
+
+    # 建唯一索引前先去掉并发重复点赞产生的重复行（保留最早的一条），并重算点赞数
+    removed = conn.execute(text(
+        "DELETE FROM post_likes WHERE id NOT IN (SELECT keep_id FROM "
+        "(SELECT MIN(id) AS keep_id FROM post_likes GROUP BY user_id, post_id) AS keep)"
+    )).rowcount
+    if removed:
+        conn.execute(text(
+            "UPDATE posts SET likes_count = "
+            "(SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id)"
+        ))
+        # 迁移 2 按去重前的点赞数建立了热度行，随修正后的计数重算
+        conn.execute(ranking_service.recompute_statement(conn.dialect.name))
+    removed = conn.execute(text(
+        "DELETE FROM comment_likes WHERE id NOT IN (SELECT keep_id FROM "
+        "(SELECT MIN(id) AS keep_id FROM comment_likes GROUP BY user_id, comment_id) AS keep)"
+    )).rowcount
+    if removed:
+        conn.execute(text(
+            "UPDATE comments SET likes_count = "
+            "(SELECT COUNT(*) FROM comment_likes WHERE comment_likes.comment_id = comments.id)"
+        ))
+
+    create_index(conn, PostLike, "uq_post_likes_user_post")
+    create_index(conn, PostLike, "ix_post_likes_post_user")
+    create_index(conn, CommentLike, "uq_comment_likes_user_comment")
+    create_index(conn, CommentLike, "ix_comment_likes_comment_user")
+
+
+@migration(8, "用户软删除标记")
+def add_user_deleted_at(conn):
+    add_column(conn, User.__table__.c.deleted_at)
+
+
+def head():
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def current_version():
+    """数据库当前的版本号，没有版本表（旧库）时为 0"""
+    schema_version.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        version = conn.execute(db.select(db.func.max(schema_version.c.version))).scalar()
+    return version or 0
+
+
+def _record(conn, item):
+    conn.execute(schema_version.insert().values(
+        version=item.version, description=item.description, applied_at=datetime.utcnow()
+    ))
+
+
+def upgrade(target=None):
+    """依次执行未执行过的迁移，每个迁移一个事务，返回执行了的迁移列表"""
+    target = head() if target is None else target
+    applied = []
+    for item in MIGRATIONS:
+        if item.version <= current_version() or item.version > target:
+            continue
+        with db.engine.begin() as conn:
+            item.func(conn)
+            _record(conn, item)
+        applied.append(item)
+    return applied
+
+
+def stamp():
+    """把数据库记为最新版本而不执行迁移，用于 create_all() 新建的库"""
+    version = current_version()
+    with db.engine.begin() as conn:
+        for item in MIGRATIONS:
+            if item.version > version:
+                _record(conn, item)
+
+
+def _explain(conn, statement):
+    """执行 EXPLAIN，返回结果行"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        return conn.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+    if conn.dialect.name == "postgresql":
+        # 数据量小时 PostgreSQL 倾向顺序扫描，检查时只关心索引是否可用
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+    return conn.execute(text("EXPLAIN " + sql)).all()
+
+
+def _uses_index(dialect, rows, index):
+    """执行计划是否实际使用了该索引；只出现在 MySQL 的 possible_keys 中不算"""
+    if dialect == "mysql":
+        return any(row._mapping.get("key") == index for row in rows)
+    if dialect == "sqlite":
+        pattern = rf"USING (COVERING )?INDEX {re.escape(index)}\b"
+    else:
+        pattern = rf"(using|on) {re.escape(index)}\b"
+    return any(re.search(pattern, str(row[-1])) for row in rows)
+
+
+def explain_checks():
+    """主要查询及其应当使用的索引：[(说明, 索引名, 语句)]"""
+    select = db.select
+    return [
+        ("帖子列表（按状态）", "ix_posts_status_created",
+         select(Post.id).where(Post.status == "approved")
+         .order_by(Post.created_at.desc(), Post.id.desc()).limit(10)),
+        ("帖子列表（按分类和状态）", "ix_posts_category_status_created",
+         select(Post.id).where(Post.category_id == 1, Post.status == "approved")
+         .order_by(Post.created_at.desc(), Post.id.desc()).limit(10)),
+        ("评论列表", "ix_comments_post_created",
+         select(Comment.id).where(Comment.post_id == 1)
+         .order_by(Comment.created_at.desc(), Comment.id.desc()).limit(20)),
+        ("帖子点赞状态", "uq_post_likes_user_post",
+         select(PostLike.id).where(PostLike.user_id == 1, PostLike.post_id == 1)),
+        ("帖子点赞列表", "ix_post_likes_post_user",
+         select(PostLike.user_id).where(PostLike.post_id == 1)),
+        ("评论点赞状态", "uq_comment_likes_user_comment",
+         select(CommentLike.id).where(CommentLike.user_id == 1, CommentLike.comment_id == 1)),
+        ("评论点赞列表", "ix_comment_likes_comment_user",
+         select(CommentLike.user_id).where(CommentLike.comment_id == 1)),
+        ("未读通知", "ix_notifications_user_read_created",
+         select(Notification.id).where(Notification.user_id == 1, Notification.is_read == False)  # noqa: E712
+         .order_by(Notification.created_at.desc()).limit(20)),
+    ]
+
+
+def check_plans():
+    """对主要查询执行 EXPLAIN，返回 [(说明, 索引名, 是否使用了该索引, 执行计划)]"""
+    results = []
+    with db.engine.connect() as conn:
+        for label, index, statement in explain_checks():
+            with conn.begin():
+                rows = _explain(conn, statement)
+            plan = "\n".join(" ".join(str(value) for value in row) for row in rows)
+            results.append((label, index, _uses_index(conn.dialect.name, rows, index), plan))
+    return results
@@ -14,6 +14,10 @@ class User(db.Model):
     student_id = db.Column(db.String(50))
     admission_year = db.Column(db.Integer)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
+    # 未读通知数，随发送和已读标记原子更新，供角标轮询使用
+    unread_notifications_count = db.Column(db.Integer, default=0, nullable=False)
+    # 软删除时间：已删除但从属数据尚未被后台任务清理完的用户，不能登录也不再显示
+    deleted_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
@@ -41,15 +45,25 @@ class PostStatus:
     PENDING = "pending"
     APPROVED = "approved"
     REJECTED = "rejected"
+    # 已删除、等待后台任务清理评论和点赞的帖子
+    DELETED = "deleted"
 
 
 class Post(db.Model):
     __tablename__ = "posts"
+    __table_args__ = (
+        # 帖子列表：按状态或分类+状态筛选，按发布时间倒序
+        db.Index("ix_posts_status_created", "status", "created_at"),
+        db.Index("ix_posts_category_status_created", "category_id", "status", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content_markdown = db.Column(db.Text, nullable=False)
     content_excerpt = db.Column(db.Text)
+    # 正文渲染（清洗）后的 HTML 缓存，rendered_hash 为正文和渲染器版本的哈希，不一致时重新渲染
+    content_rendered = db.Column(db.Text)
+    rendered_hash = db.Column(db.String(64))
 
     author_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey("categories.id"), nullable=False)
@@ -65,6 +79,9 @@ class Post(db.Model):
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
     views = db.Column(db.Integer, default=0, nullable=False)
+    # 冗余计数，随评论/点赞写入同事务原子更新，可用 reconcile_counters.py 校正
+    comments_count = db.Column(db.Integer, default=0, nullable=False)
+    likes_count = db.Column(db.Integer, default=0, nullable=False)
 
     author = db.relationship("User", back_populates="posts")
     category = db.relationship("Category", back_populates="posts")
@@ -80,8 +97,68 @@ class Post(db.Model):
         self.content_markdown = value
 
 
+class PostHotScore(db.Model):
+    """帖子热度表，score 为按发布时间衰减后的热度，供 sort=hot 做索引范围扫描"""
+
+    __tablename__ = "post_hot_scores"
+    __table_args__ = (
+        db.Index("ix_post_hot_scores_status_score", "status", "score", "post_id"),
+        db.Index(
+            "ix_post_hot_scores_category_status_score",
+            "category_id",
+            "status",
+            "score",
+            "post_id",
+        ),
+    )
+
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    category_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    post_created_at = db.Column(db.DateTime, nullable=False)
+    # 未衰减的互动分（评论、点赞、浏览加权和）
+    engagement = db.Column(db.Float(precision=53), default=0, nullable=False)
+    score = db.Column(db.Float(precision=53), default=0, nullable=False)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+
+class SearchDocument(db.Model):
+    """全文检索的文档表，记录每篇帖子的词数和筛选字段"""
+
+    __tablename__ = "search_documents"
+
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    category_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    length = db.Column(db.Integer, default=0, nullable=False)
+
+
+class SearchPosting(db.Model):
+    """全文检索的倒排表：词项 -> 帖子及词频"""
+
+    __tablename__ = "search_postings"
+    __table_args__ = (db.Index("ix_search_postings_post_id", "post_id"),)
+
+    term = db.Column(db.String(32), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    tf = db.Column(db.Integer, default=0, nullable=False)
+
+
+class UploadReference(db.Model):
+    """帖子正文中引用的上传文件，没有任何引用的文件由 upload_gc.py 清理"""
+
+    __tablename__ = "upload_references"
+    __table_args__ = (db.Index("ix_upload_references_post_id", "post_id"),)
+
+    blob = db.Column(db.String(80), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+
+
 class Comment(db.Model):
     __tablename__ = "comments"
+    __table_args__ = (db.Index("ix_comments_post_created", "post_id", "created_at"),)
 
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
@@ -91,6 +168,7 @@ class Comment(db.Model):
     updated_at = db.Column(
         db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
     )
+    likes_count = db.Column(db.Integer, default=0, nullable=False)
 
     post = db.relationship("Post", back_populates="comments")
     author = db.relationship("User", back_populates="comments")
@@ -99,6 +177,11 @@ class Comment(db.Model):
 
 class Notification(db.Model):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # 收件箱：按未读筛选或全部，均按时间倒序分页
+        db.Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+        db.Index("ix_notifications_user_created", "user_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -110,8 +193,32 @@ class Notification(db.Model):
     user = db.relationship("User", back_populates="notifications")
 
 
+class Job(db.Model):
+    """后台任务表：请求只负责写入，由工作线程取出执行，失败按退避重试，超过次数进入死信"""
+
+    __tablename__ = "jobs"
+    __table_args__ = (db.Index("ix_jobs_status_run_at", "status", "run_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    # pending / running / dead，执行成功的任务直接删除
+    status = db.Column(db.String(20), default="pending", nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class PostLike(db.Model):
     __tablename__ = "post_likes"
+    __table_args__ = (
+        # 每个用户对同一帖子只能点赞一次；按帖子统计和删除走 post_id 开头的索引
+        db.Index("uq_post_likes_user_post", "user_id", "post_id", unique=True),
+        db.Index("ix_post_likes_post_user", "post_id", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -124,6 +231,10 @@ class PostLike(db.Model):
 
 class CommentLike(db.Model):
     __tablename__ = "comment_likes"
+    __table_args__ = (
+        db.Index("uq_comment_likes_user_comment", "user_id", "comment_id", unique=True),
+        db.Index("ix_comment_likes_comment_user", "comment_id", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
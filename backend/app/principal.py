@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import g, has_app_context, session
+
+from app.models import User
+from app import db
+
+# 当前登录用户的身份信息，只包含鉴权和 /api/auth/me 需要的字段
+Principal = namedtuple(
+    'Principal', 'id username email real_name student_id admission_year is_admin'
+)
+
+_MISSING = object()
+
+
+class PrincipalCache:
+    """进程内的用户身份缓存，按 LRU 淘汰，条目超过 ttl 秒后重新查库
+
+    修改或删除用户时调用 invalidate；其他进程里的旧条目最多保留 ttl 秒。
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (principal, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def set(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def init_app(app):
+    principal_cache.maxsize = app.config.get('PRINCIPAL_CACHE_SIZE', 10000)
+    principal_cache.ttl = app.config.get('PRINCIPAL_CACHE_TTL', 60)
+    principal_cache.clear()
+
+
+def load_principal(user_id):
+    """按 id 取用户身份，先查缓存，未命中时用一次窄列主键查询；用户不存在或已删除返回 None"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    row = db.session.query(
+        User.id, User.username, User.email, User.real_name,
+        User.student_id, User.admission_year, User.is_admin,
+    ).filter(User.id == user_id, User.deleted_at.is_(None)).first()
+    if row is None:
+        return None
+    principal = Principal(*row)
+    principal_cache.set(principal)
+    return principal
+
+
+def current_principal():
+    """当前请求的登录用户，每个请求最多解析一次；未登录或用户已删除时返回 None"""
+    principal = g.get('_principal', _MISSING)
+    if principal is _MISSING:
+        user_id = session.get('user_id')
+        principal = load_principal(user_id) if user_id else None
+        g._principal = principal
+    return principal
+
+
+def invalidate_principal(user_id):
+    """用户信息变更后调用，同时清掉本请求中已解析的身份"""
+    principal_cache.invalidate(user_id)
+    if not has_app_context():
+        return
+    principal = g.get('_principal')
+    if principal is not None and principal.id == user_id:
+        g.pop('_principal', None)
@@ -0,0 +1,126 @@
+import json
+import queue
+import threading
+import time
+
+
+class Broker:
+    """通知推送的发布/订阅
+
+    订阅者按用户 id 注册本地队列；发布的消息是一批用户 id，表示这些用户有新通知。
+    默认在进程内直接分发；配置了 Redis 兼容服务时，消息经其 PUBLISH 广播到所有工作进程，
+    每个进程只用一个后台线程接收后再分发给本地订阅者。
+    """
+
+    CHANNEL = 'tfms:notifications'
+    # 与 Redis 的连接断开后重连的退避：从 1 秒开始翻倍，最多 30 秒
+    RECONNECT_MIN = 1
+    RECONNECT_MAX = 30
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set(queue)
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener = None
+        self._logger = None
+
+    def init_app(self, app):
+        self._logger = app.logger
+        if app.config.get('PUBSUB_BACKEND', 'memory') == 'redis':
+            import redis
+
+            self._redis = redis.Redis.from_url(app.config['PUBSUB_URL'])
+        else:
+            self._redis = None
+
+    def subscribe(self, user_id, maxsize=100):
+        """注册一个订阅队列，用完后必须调用 unsubscribe"""
+        self._ensure_listener()
+        subscription = queue.Queue(maxsize=maxsize)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def publish(self, user_ids):
+        """通知这些用户有新消息"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        if self._redis is not None:
+            self._redis.publish(self.CHANNEL, json.dumps(user_ids))
+        else:
+            self.deliver(user_ids)
+
+    def deliver(self, user_ids):
+        """分发给本进程内的订阅者；队列满说明对方已有未处理的唤醒信号，直接跳过"""
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            try:
+                subscription.put_nowait(True)
+            except queue.Full:
+                pass
+
+    def _ensure_listener(self):
+        if self._redis is None or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='pubsub-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        """接收广播的后台线程；连接断开时按退避重连，线程意外退出时清空 _listener，下次订阅时重新启动"""
+        try:
+            delay = self.RECONNECT_MIN
+            connected_before = False
+            while True:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                try:
+                    pubsub.subscribe(self.CHANNEL)
+                    if connected_before:
+                        # 断线期间的广播已丢失，唤醒本进程全部订阅者，让它们按 id 重新查一次
+                        self.deliver(self._subscribed_users())
+                    connected_before = True
+                    delay = self.RECONNECT_MIN
+                    for message in pubsub.listen():
+                        try:
+                            self.deliver(json.loads(message['data']))
+                        except (TypeError, ValueError):
+                            continue
+                except Exception:
+                    if self._logger is not None:
+                        self._logger.warning('pubsub connection lost, reconnecting in %ss', delay, exc_info=True)
+                finally:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                time.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX)
+        finally:
+            with self._lock:
+                self._listener = None
+
+    def _subscribed_users(self):
+        with self._lock:
+            return list(self._subscribers)
+
+
+broker = Broker()
@@ -1,7 +1,10 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify
 from app.models import Post, User
 from app.log import log
+from app.principal import current_principal, invalidate_principal
 from app.services.post_service import approve_post, reject_post
+from app.services import deletion_service, like_service
+from app.cache import response_cache
 from .auth import admin_required
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
@@ -33,7 +36,7 @@ def approve_post_api(post_id):
     if not post:
         return jsonify({'error': '帖子不存在'}), 404
 
-    log(f'用户 {post.author.username} 的帖子 {post.title} (id:{post.id}) 已通过审核，执行者：{session.get("username")}')
+    log(f'用户 {post.author.username} 的帖子 {post.title} (id:{post.id}) 已通过审核，执行者：{current_principal().username}', action='approve_post', post_id=post.id)
 
     return jsonify({
         'id': post.id,
@@ -51,7 +54,7 @@ def reject_post_api(post_id):
     if not post:
         return jsonify({'error': '帖子不存在'}), 404
 
-    log(f'用户 {post.author.username} 的帖子 {post.title} (id:{post.id}) 未通过审核，原因：{reason}，执行者：{session.get("username")}')
+    log(f'用户 {post.author.username} 的帖子 {post.title} (id:{post.id}) 未通过审核，原因：{reason}，执行者：{current_principal().username}', action='reject_post', post_id=post.id)
     
     return jsonify({
         'id': post.id,
@@ -62,7 +65,7 @@ def reject_post_api(post_id):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
-    users = User.query.order_by(User.id).all()
+    users = User.query.filter(User.deleted_at.is_(None)).order_by(User.id).all()
     
     users_data = []
     for user in users:
@@ -86,6 +89,8 @@ def update_user(user_id):
     if not user:
         return jsonify({'error': '用户不存在'}), 404
     
+    # 执行者要在清掉身份缓存之前读取：管理员修改或删除自己时，身份会被重新加载甚至变为 None
+    operator = current_principal().username
     data = request.json
     user.real_name = data.get('real_name', user.real_name)
     user.student_id = data.get('student_id', user.student_id)
@@ -94,8 +99,9 @@ def update_user(user_id):
     
     from app import db
     db.session.commit()
+    invalidate_principal(user_id)
 
-    log(f'用户 {user.username} 的信息已更新，执行者：{session.get("username")}')
+    log(f'用户 {user.username} 的信息已更新，执行者：{operator}', action='update_user', target_user_id=user_id)
     
     return jsonify({
         'id': user.id,
@@ -111,14 +117,18 @@ def update_user(user_id):
 @admin_required
 def delete_user(user_id):
     user = User.query.get(user_id)
-    if not user:
+    if not user or user.deleted_at is not None:
         return jsonify({'error': '用户不存在'}), 404
     
-    from app import db
-    db.session.delete(user)
-    db.session.commit()
+    username = user.username
+    operator = current_principal().username
+    # 数据少时直接删除；否则先软删除，由后台任务分批清理帖子、评论、点赞和通知
+    purged = deletion_service.delete_user(user_id)
+    invalidate_principal(user_id)
+    like_service.liked_cache.invalidate(user_id)
+    response_cache.invalidate('posts')
 
-    log(f'用户 {user.username} 已删除，执行者：{session.get("username")}')
+    log(f'用户 {username} 已删除，执行者：{operator}', action='delete_user', target_user_id=user_id)
     
-    return jsonify({'message': '用户已删除'})
+    return jsonify({'message': '用户已删除', 'purged': purged})
 
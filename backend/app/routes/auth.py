@@ -1,15 +1,27 @@
 from flask import Blueprint, request, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.models import User
 from app.log import log
+from app.principal import current_principal, invalidate_principal
+from app.services.password_service import PasswordPoolBusy, hash_password, verify_password, needs_rehash
 from app import db
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+@auth_bp.errorhandler(PasswordPoolBusy)
+def password_pool_busy(error):
+    # 密码哈希进程池已满，快速拒绝而不是让请求排队
+    response = jsonify({'error': '登录人数过多，请稍后重试'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
+
 def login_required(func):
     def wrapper(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': '未登录'}), 401
+        # 已删除（包括软删除、等待清理）的用户会话立即失效，避免清理期间继续写入数据
+        if current_principal() is None:
+            session.pop('user_id', None)
+            return jsonify({'error': '未登录'}), 401
         return func(*args, **kwargs)
     wrapper.__name__ = func.__name__
     return wrapper
@@ -18,8 +30,8 @@ def admin_required(func):
     def wrapper(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': '未登录'}), 401
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin:
+        principal = current_principal()
+        if not principal or not principal.is_admin:
             return jsonify({'error': '权限不足'}), 403
         return func(*args, **kwargs)
     wrapper.__name__ = func.__name__
@@ -44,7 +56,7 @@ def register():
     if User.query.filter_by(email=email).first():
         return jsonify({'error': '邮箱已被注册'}), 400
 
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     user = User(
         username=username,
         email=email,
@@ -59,7 +71,7 @@ def register():
 
     session['user_id'] = user.id
 
-    log(f'用户 {username} 注册成功')
+    log(f'用户 {username} 注册成功', action='register')
 
     return jsonify({
         'id': user.id,
@@ -86,12 +98,20 @@ def login():
     if not user:
         user = User.query.filter_by(email=identifier).first()
 
-    if not user or not check_password_hash(user.password_hash, password):
+    if not user or user.deleted_at is not None or not verify_password(user.password_hash, password):
         return jsonify({'error': '用户名/邮箱或密码错误'}), 401
 
+    # 存储的哈希参数已过时，借登录时的明文密码升级；进程池繁忙时留到下次登录
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except PasswordPoolBusy:
+            pass
+
     session['user_id'] = user.id
 
-    log(f'用户 {user.username} 上线了')
+    log(f'用户 {user.username} 上线了', action='login')
 
     return jsonify({
         'id': user.id,
@@ -113,20 +133,12 @@ def get_current_user():
     if 'user_id' not in session:
         return jsonify({'error': '未登录'}), 401
 
-    user = User.query.get(session['user_id'])
-    if not user:
+    principal = current_principal()
+    if not principal:
         session.pop('user_id', None)
         return jsonify({'error': '用户不存在'}), 401
 
-    return jsonify({
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'real_name': user.real_name,
-        'student_id': user.student_id,
-        'admission_year': user.admission_year,
-        'is_admin': user.is_admin
-    })
+    return jsonify(principal._asdict())
 
 @auth_bp.route('/me', methods=['PUT'])
 @login_required
@@ -150,6 +162,7 @@ def update_user_info():
         user.admission_year = admission_year
 
     db.session.commit()
+    invalidate_principal(user.id)
 
     return jsonify({
         'id': user.id,
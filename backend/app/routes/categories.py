@@ -3,10 +3,13 @@ from app.models import Category
 from app.log import log
 from .auth import login_required, admin_required
 from app import db
+from app.cache import response_cache, cached_json, conditional_json
 
 categories_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 
 @categories_bp.route('', methods=['GET'])
+@conditional_json(max_age=60, per_user=False)
+@cached_json(lambda data: ['categories'], anonymous_only=False)
 def get_categories():
     categories = Category.query.order_by(Category.order).all()
     categories_data = []
@@ -44,8 +47,9 @@ def create_category():
     new_category = Category(name=name, slug=slug, order=order)
     db.session.add(new_category)
     db.session.commit()
+    response_cache.invalidate('categories')
 
-    log(f'用户 {session["user_id"]} 创建了分类 {new_category.name}')
+    log(f'用户 {session["user_id"]} 创建了分类 {new_category.name}', action='create_category', category_id=new_category.id)
 
     return jsonify({
         'id': new_category.id,
@@ -85,8 +89,9 @@ def update_category(category_id):
         category.order = order
     
     db.session.commit()
+    response_cache.invalidate('categories', f'category:{category_id}')
 
-    log(f'用户 {session["user_id"]} 更新了分类 {category.name}')
+    log(f'用户 {session["user_id"]} 更新了分类 {category.name}', action='update_category', category_id=category_id)
     
     return jsonify({
         'id': category.id,
@@ -109,7 +114,8 @@ def delete_category(category_id):
     
     db.session.delete(category)
     db.session.commit()
+    response_cache.invalidate('categories', f'category:{category_id}')
 
-    log(f'用户 {session["user_id"]} 删除了分类 {category.name}')
+    log(f'用户 {session["user_id"]} 删除了分类 {category.name}', action='delete_category', category_id=category_id)
     
     return jsonify({'message': '分类删除成功'})
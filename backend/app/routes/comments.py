@@ -1,41 +1,94 @@
 from flask import Blueprint, request, jsonify
-from app.models import Comment, CommentLike, User
+from sqlalchemy.orm import selectinload
+from app.models import Post, PostStatus, Comment
 from app import db
+from app.services.counter_service import increment_counter
+from app.services import ranking_service, like_service
+from app.services.pagination import encode_cursor, seek_after
+from app.cache import response_cache, cached_json, conditional_json
 from app.log import log
+from app.principal import current_principal
 from .auth import login_required
 
 comments_bp = Blueprint('comments', __name__, url_prefix='/api')
 
+COMMENTS_PAGE_SIZE = 20
+COMMENTS_MAX_PAGE_SIZE = 100
+
+def _page_args():
+    limit = request.args.get('limit', COMMENTS_PAGE_SIZE, type=int)
+    return max(1, min(limit, COMMENTS_MAX_PAGE_SIZE)), request.args.get('cursor')
+
+def _comments_query(query, post_id, cursor):
+    """按 (created_at, id) 倒序的评论分页查询，游标不合法时抛出 ValueError"""
+    query = query.filter(Comment.post_id == post_id).order_by(Comment.created_at.desc(), Comment.id.desc())
+    if cursor:
+        query = query.filter(seek_after(Comment.created_at, Comment.id, cursor))
+    return query
+
+def comments_validator(post_id):
+    """已登录用户评论页的校验数据：本页评论的窄列和当前用户的点赞状态
+
+    匿名请求走响应缓存，返回 None，由响应体计算 ETag。
+    """
+    from flask import session
+    if 'user_id' not in session:
+        return None
+    
+    limit, cursor = _page_args()
+    try:
+        rows = _comments_query(
+            db.session.query(Comment.id, Comment.updated_at, Comment.likes_count), post_id, cursor
+        ).limit(limit + 1).all()
+    except ValueError:
+        return None
+    
+    liked_ids = like_service.liked_ids(session['user_id'], 'comment', [row.id for row in rows])
+    last_modified = max((row.updated_at for row in rows), default=None)
+    return [tuple(row) for row in rows] + [sorted(liked_ids)], last_modified
+
 @comments_bp.route('/posts/<int:post_id>/comments', methods=['GET'])
+@conditional_json(comments_validator)
+@cached_json(lambda data, post_id: [f'comments:{post_id}'])
 def get_comments(post_id):
-    comments = Comment.query.filter_by(post_id=post_id).order_by(Comment.created_at.desc()).all()
+    limit, cursor = _page_args()
+    
+    # 作者按页批量加载
+    try:
+        query = _comments_query(Comment.query.options(selectinload(Comment.author)), post_id, cursor)
+    except ValueError:
+        return jsonify({'error': '无效的游标'}), 400
+    
+    # 多取一条用于判断是否还有下一页
+    comments = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1].created_at, comments[-1].id)
     
     comments_data = []
     from flask import session
     user_id = session.get('user_id')
     
+    liked_ids = like_service.liked_ids(user_id, 'comment', [comment.id for comment in comments])
+    
     for comment in comments:
-        # 获取评论的点赞信息
-        likes_count = comment.likes.count()
-        is_liked = False
-        
-        if user_id:
-            existing_like = CommentLike.query.filter_by(user_id=user_id, comment_id=comment.id).first()
-            is_liked = existing_like is not None
-        
         comments_data.append({
             'id': comment.id,
             'post_id': comment.post_id,
             'author_id': comment.author_id,
             'author_username': comment.author.username,
             'content': comment.content,
-            'likes_count': likes_count,
-            'is_liked': is_liked,
+            'likes_count': comment.likes_count,
+            'is_liked': comment.id in liked_ids,
             'created_at': comment.created_at.isoformat(),
             'updated_at': comment.updated_at.isoformat()
         })
     
-    return jsonify(comments_data)
+    return jsonify({
+        'items': comments_data,
+        'next_cursor': next_cursor
+    })
 
 @comments_bp.route('/posts/<int:post_id>/comments', methods=['POST'])
 @login_required
@@ -49,6 +102,10 @@ def create_comment(post_id):
     from flask import session
     author_id = session['user_id']
     
+    status = db.session.query(Post.status).filter(Post.id == post_id).scalar()
+    if status is None or status == PostStatus.DELETED:
+        return jsonify({'error': '帖子不存在'}), 404
+    
     comment = Comment(
         post_id=post_id,
         author_id=author_id,
@@ -56,9 +113,12 @@ def create_comment(post_id):
     )
     
     db.session.add(comment)
+    increment_counter(Post, post_id, Post.comments_count)
+    ranking_service.record_event(post_id, 'comment')
     db.session.commit()
+    response_cache.invalidate(f'post:{post_id}', f'comments:{post_id}')
 
-    log(f'用户{author_id}创建了评论{comment.id}:, {comment.content}')
+    log(f'用户{author_id}创建了评论{comment.id}:, {comment.content}', action='create_comment', post_id=post_id, comment_id=comment.id)
 
     return jsonify({
         'id': comment.id,
@@ -81,61 +141,16 @@ def delete_comment(comment_id):
     user_id = session['user_id']
     
     # 只有评论作者或管理员可以删除评论
-    from app.models import User
-    user = User.query.get(user_id)
-    if not (user_id == comment.author_id or user.is_admin):
+    principal = current_principal()
+    if not (user_id == comment.author_id or (principal and principal.is_admin)):
         return jsonify({'error': '无权删除此评论'}), 403
     
     db.session.delete(comment)
+    increment_counter(Post, comment.post_id, Post.comments_count, -1)
+    ranking_service.record_event(comment.post_id, 'comment', -1)
     db.session.commit()
+    response_cache.invalidate(f'post:{comment.post_id}', f'comments:{comment.post_id}')
 
-    log(f'用户id: {user_id}删除了评论id: {comment_id}: {comment.content}')
+    log(f'用户id: {user_id}删除了评论id: {comment_id}: {comment.content}', action='delete_comment', post_id=comment.post_id, comment_id=comment_id)
     
     return jsonify({'message': '评论删除成功'})
-
-@comments_bp.route('/comments/<int:comment_id>/like', methods=['POST'])
-@login_required
-def like_comment(comment_id):
-    comment = Comment.query.get(comment_id)
-    if not comment:
-        return jsonify({'error': '评论不存在'}), 404
-    
-    from flask import session
-    user_id = session['user_id']
-    
-    # 检查是否已经点赞
-    existing_like = CommentLike.query.filter_by(user_id=user_id, comment_id=comment_id).first()
-    if existing_like:
-        return jsonify({'error': '已经点赞过了'}), 400
-    
-    # 创建点赞记录
-    new_like = CommentLike(user_id=user_id, comment_id=comment_id)
-    db.session.add(new_like)
-    db.session.commit()
-
-    log(f'用户id: {user_id}点赞了评论id: {comment_id}: {comment.content}')
-
-    return jsonify({'message': '点赞成功'})
-
-@comments_bp.route('/comments/<int:comment_id>/like', methods=['DELETE'])
-@login_required
-def unlike_comment(comment_id):
-    comment = Comment.query.get(comment_id)
-    if not comment:
-        return jsonify({'error': '评论不存在'}), 404
-    
-    from flask import session
-    user_id = session['user_id']
-    
-    # 查找点赞记录
-    existing_like = CommentLike.query.filter_by(user_id=user_id, comment_id=comment_id).first()
-    if not existing_like:
-        return jsonify({'error': '还没有点赞'}), 400
-    
-    # 删除点赞记录
-    db.session.delete(existing_like)
-    db.session.commit()
-
-    log(f'用户id: {user_id}取消点赞了评论id: {comment_id}: {comment.content}')
-    
-    return jsonify({'message': '取消点赞成功'})
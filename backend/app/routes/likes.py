@@ -1,119 +1,107 @@
 from flask import Blueprint, request, jsonify
-from app.models import PostLike, CommentLike, Post, Comment
-from app import db
 from app.log import log
+from app.services.like_service import set_post_like, set_comment_like, liked_ids
 from .auth import login_required
 
 likes_bp = Blueprint('likes', __name__, url_prefix='/api')
 
-@likes_bp.route('/posts/<int:post_id>/like', methods=['POST'])
+# 批量查询点赞状态时每类 id 的数量上限
+LIKE_STATUS_MAX_IDS = 200
+
+def _id_list(name):
+    """解析逗号分隔的 id 参数，不合法时抛出 ValueError"""
+    value = request.args.get(name, '')
+    ids = [int(item) for item in value.split(',') if item.strip()]
+    if len(ids) > LIKE_STATUS_MAX_IDS:
+        raise ValueError(name)
+    return ids
+
+# 点赞接口是幂等的：重复点赞或重复取消返回 200，changed 为 false
+def _like_response(result, message):
+    return jsonify({
+        'message': message,
+        'liked': result.liked,
+        'changed': result.changed,
+        'likes_count': result.likes_count,
+    })
+
+@likes_bp.route('/likes', methods=['GET'])
 @login_required
-def like_post(post_id):
-    post = Post.query.get(post_id)
-    if not post:
-        return jsonify({'error': '帖子不存在'}), 404
-    
+def like_status():
+    """列表页批量查询当前用户的点赞状态：?posts=1,2,3&comments=4,5"""
     from flask import session
     user_id = session['user_id']
-    
-    # 检查是否已经点赞
-    existing_like = PostLike.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if existing_like:
-        return jsonify({'error': '已经点赞过'}), 400
-    
-    # 创建点赞记录
-    like = PostLike(user_id=user_id, post_id=post_id)
-    db.session.add(like)
-    db.session.commit()
-    
-    # 返回点赞数
-    likes_count = PostLike.query.filter_by(post_id=post_id).count()
-
-    log(f'用户id: {user_id} 点赞了帖子 {post_id}: {post.title}')
 
+    try:
+        post_ids, comment_ids = _id_list('posts'), _id_list('comments')
+    except ValueError:
+        return jsonify({'error': f'id 必须为整数，每类最多 {LIKE_STATUS_MAX_IDS} 个'}), 400
+
+    liked_posts = liked_ids(user_id, 'post', post_ids)
+    liked_comments = liked_ids(user_id, 'comment', comment_ids)
     return jsonify({
-        'message': '点赞成功',
-        'likes_count': likes_count
+        'posts': {str(post_id): post_id in liked_posts for post_id in post_ids},
+        'comments': {str(comment_id): comment_id in liked_comments for comment_id in comment_ids},
     })
 
+@likes_bp.route('/posts/<int:post_id>/like', methods=['POST'])
+@login_required
+def like_post(post_id):
+    from flask import session
+    user_id = session['user_id']
+
+    result = set_post_like(post_id, user_id, True)
+    if result is None:
+        return jsonify({'error': '帖子不存在'}), 404
+
+    if result.changed:
+        log(f'用户id: {user_id} 点赞了帖子 {post_id}', action='like_post', post_id=post_id)
+
+    return _like_response(result, '点赞成功')
+
+@likes_bp.route('/posts/<int:post_id>/like', methods=['DELETE'])
 @likes_bp.route('/posts/<int:post_id>/unlike', methods=['POST'])
 @login_required
 def unlike_post(post_id):
-    post = Post.query.get(post_id)
-    if not post:
-        return jsonify({'error': '帖子不存在'}), 404
-    
     from flask import session
     user_id = session['user_id']
-    
-    # 查找并删除点赞记录
-    like = PostLike.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if not like:
-        return jsonify({'error': '未点赞过'}), 400
-    
-    db.session.delete(like)
-    db.session.commit()
-    
-    # 返回点赞数
-    likes_count = PostLike.query.filter_by(post_id=post_id).count()
-
-    log(f'用户id: {user_id} 取消点赞了帖子 {post_id}: {post.title}')
 
-    return jsonify({
-        'message': '取消点赞成功',
-        'likes_count': likes_count
-    })
+    result = set_post_like(post_id, user_id, False)
+    if result is None:
+        return jsonify({'error': '帖子不存在'}), 404
+
+    if result.changed:
+        log(f'用户id: {user_id} 取消点赞了帖子 {post_id}', action='unlike_post', post_id=post_id)
+
+    return _like_response(result, '取消点赞成功')
 
 @likes_bp.route('/comments/<int:comment_id>/like', methods=['POST'])
 @login_required
 def like_comment(comment_id):
-    comment = Comment.query.get(comment_id)
-    if not comment:
-        return jsonify({'error': '评论不存在'}), 404
-    
     from flask import session
     user_id = session['user_id']
-    
-    # 检查是否已经点赞
-    existing_like = CommentLike.query.filter_by(user_id=user_id, comment_id=comment_id).first()
-    if existing_like:
-        return jsonify({'error': '已经点赞过'}), 400
-    
-    # 创建点赞记录
-    like = CommentLike(user_id=user_id, comment_id=comment_id)
-    db.session.add(like)
-    db.session.commit()
-    
-    # 返回点赞数
-    likes_count = CommentLike.query.filter_by(comment_id=comment_id).count()
-    
-    return jsonify({
-        'message': '点赞成功',
-        'likes_count': likes_count
-    })
 
+    result = set_comment_like(comment_id, user_id, True)
+    if result is None:
+        return jsonify({'error': '评论不存在'}), 404
+
+    if result.changed:
+        log(f'用户id: {user_id} 点赞了评论 {comment_id}', action='like_comment', comment_id=comment_id)
+
+    return _like_response(result, '点赞成功')
+
+@likes_bp.route('/comments/<int:comment_id>/like', methods=['DELETE'])
 @likes_bp.route('/comments/<int:comment_id>/unlike', methods=['POST'])
 @login_required
 def unlike_comment(comment_id):
-    comment = Comment.query.get(comment_id)
-    if not comment:
-        return jsonify({'error': '评论不存在'}), 404
-    
     from flask import session
     user_id = session['user_id']
-    
-    # 查找并删除点赞记录
-    like = CommentLike.query.filter_by(user_id=user_id, comment_id=comment_id).first()
-    if not like:
-        return jsonify({'error': '未点赞过'}), 400
-    
-    db.session.delete(like)
-    db.session.commit()
-    
-    # 返回点赞数
-    likes_count = CommentLike.query.filter_by(comment_id=comment_id).count()
-    
-    return jsonify({
-        'message': '取消点赞成功',
-        'likes_count': likes_count
-    })
+
+    result = set_comment_like(comment_id, user_id, False)
+    if result is None:
+        return jsonify({'error': '评论不存在'}), 404
+
+    if result.changed:
+        log(f'用户id: {user_id} 取消点赞了评论 {comment_id}', action='unlike_comment', comment_id=comment_id)
+
+    return _like_response(result, '取消点赞成功')
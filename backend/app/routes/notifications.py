@@ -1,36 +1,210 @@
-from flask import Blueprint, request, jsonify
-from app.models import Notification
-from app.services.notification_service import mark_notification_as_read, mark_all_notifications_as_read
+import json
+import queue
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from app.models import Notification, User
+from app.services.notification_service import mark_notification_as_read, mark_all_notifications_as_read, get_unread_count
 from .auth import login_required
 from app.log import log
+from app.principal import current_principal
+from app.cache import conditional_json
+from app.services.pagination import encode_cursor, seek_after
+from app.pubsub import broker
+from app import db
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
+# 浏览器断线后重连的等待时间（毫秒）
+STREAM_RETRY_MS = 5000
+
+def notification_data(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'content': notification.content,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat()
+    }
+
+def _notifications_query(query, user_id):
+    """按请求参数筛选通知并按 (created_at, id) 倒序分页，参数不合法时抛出 ValueError
+
+    支持 unread=1、since / until（ISO 时间）和 cursor，筛选全部下推到 SQL，
+    走 (user_id, is_read, created_at) 或 (user_id, created_at) 索引。
+    """
+    query = query.filter(Notification.user_id == user_id)
+    
+    if request.args.get('unread', type=int):
+        query = query.filter(Notification.is_read == False)  # noqa: E712
+    
+    since = request.args.get('since')
+    if since:
+        query = query.filter(Notification.created_at >= datetime.fromisoformat(since))
+    until = request.args.get('until')
+    if until:
+        query = query.filter(Notification.created_at < datetime.fromisoformat(until))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(seek_after(Notification.created_at, Notification.id, cursor))
+    
+    limit = request.args.get('limit', NOTIFICATIONS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, NOTIFICATIONS_MAX_PAGE_SIZE))
+    
+    # 多取一条用于判断是否还有下一页
+    return query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1), limit
+
+def notifications_validator():
+    from flask import session
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+    
+    # 本页通知的 id 和已读状态，新通知或标记已读都会改变 ETag
+    try:
+        query, _ = _notifications_query(
+            db.session.query(Notification.id, Notification.is_read, Notification.created_at), user_id
+        )
+    except ValueError:
+        return None
+    rows = query.all()
+    last_modified = max((row.created_at for row in rows), default=None)
+    return [tuple(row) for row in rows], last_modified
+
 @notifications_bp.route('', methods=['GET'])
 @login_required
+@conditional_json(notifications_validator)
 def get_notifications():
     from flask import session
     user_id = session['user_id']
     
-    unread_only = request.args.get('unread', type=int)
-    query = Notification.query.filter_by(user_id=user_id)
+    try:
+        query, limit = _notifications_query(Notification.query, user_id)
+    except ValueError:
+        return jsonify({'error': '无效的分页或时间参数'}), 400
     
-    if unread_only:
-        query = query.filter_by(is_read=False)
+    notifications = query.all()
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        next_cursor = encode_cursor(notifications[-1].created_at, notifications[-1].id)
     
-    notifications = query.order_by(Notification.created_at.desc()).all()
+    return jsonify({
+        'items': [notification_data(notification) for notification in notifications],
+        'next_cursor': next_cursor
+    })
+
+def _last_event_id(user_id):
+    """续传起点：Last-Event-ID 头或 last_event_id 参数，都没有时从当前最新一条之后开始"""
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if value:
+        return int(value)
+    return db.session.query(db.func.max(Notification.id)).filter_by(user_id=user_id).scalar() or 0
+
+def _notifications_after(user_id, last_id):
+    """id 大于 last_id 的通知，按 id 正序，每次最多一页"""
+    return Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.id > last_id,
+    ).order_by(Notification.id).limit(NOTIFICATIONS_MAX_PAGE_SIZE).all()
+
+@notifications_bp.route('/stream', methods=['GET'])
+@login_required
+def stream():
+    """新通知的 SSE 推送
+
+    连接空闲时只占用一个订阅队列，不占数据库连接；收到唤醒信号后按 id 查出新通知推送，
+    定期发送注释行作为心跳。断线重连时浏览器会带上 Last-Event-ID，从断点继续推送。
+    每个连接占用一个工作线程，部署时需使用线程或协程模式的 worker。
+    """
+    from flask import session
+    user_id = session['user_id']
+    
+    if broker.subscriber_count() >= current_app.config['NOTIFICATION_STREAM_MAX_CONNECTIONS']:
+        # 连接数已满，客户端改用长轮询
+        return jsonify({'error': '推送连接已满，请使用轮询'}), 503
+    
+    try:
+        last_id = _last_event_id(user_id)
+    except ValueError:
+        return jsonify({'error': '无效的 Last-Event-ID'}), 400
+    heartbeat = current_app.config['NOTIFICATION_STREAM_HEARTBEAT']
     
-    notifications_data = []
-    for notification in notifications:
-        notifications_data.append({
-            'id': notification.id,
-            'title': notification.title,
-            'content': notification.content,
-            'is_read': notification.is_read,
-            'created_at': notification.created_at.isoformat()
-        })
+    # 先订阅再查库，两者之间到达的通知也会留下唤醒信号
+    subscription = broker.subscribe(user_id)
     
-    return jsonify(notifications_data)
+    def events():
+        nonlocal last_id
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            while True:
+                notifications = _notifications_after(user_id, last_id)
+                # 空闲等待期间归还数据库连接
+                db.session.close()
+                for notification in notifications:
+                    last_id = notification.id
+                    payload = json.dumps(notification_data(notification), ensure_ascii=False)
+                    yield f'id: {notification.id}\nevent: notification\ndata: {payload}\n\n'
+                if len(notifications) == NOTIFICATIONS_MAX_PAGE_SIZE:
+                    continue
+                try:
+                    subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': heartbeat\n\n'
+        finally:
+            broker.unsubscribe(user_id, subscription)
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 关闭反向代理的缓冲，事件才能及时送达
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@notifications_bp.route('/poll', methods=['GET'])
+@login_required
+def poll():
+    """长轮询：有新通知立即返回，否则最多等待 timeout 秒
+
+    不支持 SSE 的客户端使用，下次请求带上返回的 last_event_id。
+    """
+    from flask import session
+    user_id = session['user_id']
+    
+    try:
+        last_id = _last_event_id(user_id)
+    except ValueError:
+        return jsonify({'error': '无效的 last_event_id'}), 400
+    max_timeout = current_app.config['NOTIFICATION_POLL_TIMEOUT']
+    timeout = max(0, min(request.args.get('timeout', max_timeout, type=int), max_timeout))
+    
+    subscription = broker.subscribe(user_id)
+    try:
+        notifications = _notifications_after(user_id, last_id)
+        if not notifications and timeout:
+            db.session.close()
+            try:
+                subscription.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                notifications = _notifications_after(user_id, last_id)
+    finally:
+        broker.unsubscribe(user_id, subscription)
+    
+    return jsonify({
+        'items': [notification_data(notification) for notification in notifications],
+        'last_event_id': notifications[-1].id if notifications else last_id
+    })
+
+@notifications_bp.route('/unread_count', methods=['GET'])
+@login_required
+def unread_count():
+    from flask import session
+    return jsonify({'unread_count': get_unread_count(session['user_id'])})
 
 @notifications_bp.route('/<int:notification_id>/read', methods=['POST'])
 @login_required
@@ -42,7 +216,7 @@ def mark_as_read(notification_id):
     if not success:
         return jsonify({'error': '通知不存在或无权操作'}), 404
 
-    log(f'用户id: {user_id}标记了通知id: {notification_id}为已读')
+    log(f'用户id: {user_id}标记了通知id: {notification_id}为已读', action='read_notification', notification_id=notification_id)
     return jsonify({'message': '标记已读成功'})
 
 @notifications_bp.route('/read_all', methods=['POST'])
@@ -52,7 +226,7 @@ def mark_all_as_read():
     user_id = session['user_id']
     
     mark_all_notifications_as_read(user_id)
-    log(f'用户id: {user_id}标记了所有通知为已读')
+    log(f'用户id: {user_id}标记了所有通知为已读', action='read_all_notifications')
     return jsonify({'message': '全部标记已读成功'})
 
 @notifications_bp.route('/send', methods=['POST'])
@@ -62,9 +236,8 @@ def send_notification():
     user_id = session['user_id']
     
     # 检查是否为管理员
-    from app.models import User
-    current_user = User.query.get(user_id)
-    if not current_user.is_admin:
+    principal = current_principal()
+    if not principal or not principal.is_admin:
         return jsonify({'error': '只有管理员可以发送站内信'}), 403
     
     data = request.get_json()
@@ -75,9 +248,13 @@ def send_notification():
     if not user_ids or not title or not content:
         return jsonify({'error': '用户ID、标题和内容不能为空'}), 400
     
-    from app.services.notification_service import send_notification as send_notif
-    for target_user_id in user_ids:
-        send_notif(target_user_id, title, content)
+    # 只给存在的用户发送，整批在一个事务中写入
+    from app.services.notification_service import send_bulk_notifications
+    existing_ids = {
+        target_id for (target_id,) in db.session.query(User.id).filter(User.id.in_(user_ids))
+    }
+    target_ids = [target_id for target_id in user_ids if target_id in existing_ids]
+    timings = send_bulk_notifications(target_ids, title, content)
     
-    log(f'管理员id: {user_id}向用户id: {user_ids}发送了站内信')
-    return jsonify({'message': '站内信发送成功'})
+    log(f'管理员id: {user_id}向用户id: {user_ids}发送了站内信', action='send_notification', recipients=len(target_ids), batches=len(timings))
+    return jsonify({'message': '站内信发送成功', 'sent': len(target_ids)})
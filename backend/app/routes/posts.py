@@ -1,12 +1,19 @@
-from flask import Blueprint, request, jsonify
-from app.models import Post, PostStatus, PostLike
+from flask import Blueprint, request, jsonify, make_response
+from app.models import Post, PostStatus, Category
 from app.services.post_service import create_post, approve_post, reject_post, get_posts
+from app.services import ranking_service, view_counter, search_service, upload_service, like_service, deletion_service
+from app.services.job_queue import enqueue
+from app.services.render_service import RENDERER_VERSION, render_post, rendered_html
 from .auth import login_required, admin_required
 from app import db
+from app.cache import response_cache, cached_json, conditional_json, request_cache_key, make_etag, is_not_modified, set_validators
 from app.log import log
+from app.principal import current_principal
 
 posts_bp = Blueprint('posts', __name__, url_prefix='/api/posts')
 
+POSTS_MAX_PAGE_SIZE = 100
+
 @posts_bp.route('', methods=['POST'])
 @login_required
 def create_post_api():
@@ -23,12 +30,12 @@ def create_post_api():
     
     post = create_post(title, content_html, category_id, author_id)
 
-    log(f'用户{session["user_id"]}创建了帖子：{title}')
+    log(f'用户{session["user_id"]}创建了帖子：{title}', action='create_post', post_id=post.id)
 
     return jsonify({
         'id': post.id,
         'title': post.title,
-        'content_html': post.content_html,
+        'content_html': rendered_html(post),
         'content_excerpt': post.content_excerpt,
         'author_id': post.author_id,
         'category_id': post.category_id,
@@ -37,32 +44,66 @@ def create_post_api():
         'updated_at': post.updated_at.isoformat()
     })
 
-@posts_bp.route('', methods=['GET'])
-def get_posts_api():
-    page = request.args.get('page', 1, type=int)
-    page_size = request.args.get('page_size', 10, type=int)
+def post_summary(post):
+    """列表中单篇帖子的摘要数据"""
+    return {
+        'id': post.id,
+        'title': post.title,
+        'content_excerpt': post.content_excerpt,
+        'author_id': post.author_id,
+        'author_username': post.author.username,
+        'category_id': post.category_id,
+        'category_name': post.category.name,
+        'status': post.status,
+        'views': post.views,
+        'comments_count': post.comments_count,
+        'likes_count': post.likes_count,
+        'created_at': post.created_at.isoformat(),
+        'updated_at': post.updated_at.isoformat()
+    }
+
+def post_tags(post):
+    """单篇帖子数据的缓存失效标签"""
+    return [f'post:{post.id}', f'category:{post.category_id}']
+
+def listing_tags(data, **kwargs):
+    """帖子列表的缓存失效标签：列表本身以及其中每篇帖子和分类"""
+    tags = {'posts'}
+    for item in data['items']:
+        tags.add(f'post:{item["id"]}')
+        tags.add(f'category:{item["category_id"]}')
+    return list(tags)
+
+def _listing_args():
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = max(1, min(request.args.get('page_size', 10, type=int), POSTS_MAX_PAGE_SIZE))
     category = request.args.get('category', type=int)
     status = request.args.get('status')
     sort = request.args.get('sort')
+    # 传入 cursor 参数（首屏可为空）即启用游标分页
+    cursor = request.args.get('cursor')
+    return page, page_size, category, status, sort, cursor
+
+@posts_bp.route('', methods=['GET'])
+# ETag 由（可能来自缓存的）响应体计算，缓存命中时不查数据库
+@conditional_json(max_age=10, per_user=False)
+@cached_json(listing_tags, anonymous_only=False)
+def get_posts_api():
+    page, page_size, category, status, sort, cursor = _listing_args()
     
-    result = get_posts(page, page_size, category, status, sort)
+    try:
+        result = get_posts(page, page_size, category, status, sort, cursor)
+    except ValueError:
+        return jsonify({'error': '无效的游标'}), 400
     
-    posts_data = []
-    for post in result['items']:
-        posts_data.append({
-            'id': post.id,
-            'title': post.title,
-            'content_excerpt': post.content_excerpt,
-            'author_id': post.author_id,
-            'author_username': post.author.username,
-            'category_id': post.category_id,
-            'category_name': post.category.name,
-            'status': post.status,
-            'views': post.views,
-            'comments_count': post.comments.count(),
-            'likes_count': post.likes.count(),
-            'created_at': post.created_at.isoformat(),
-            'updated_at': post.updated_at.isoformat()
+    posts_data = [post_summary(post) for post in result['items']]
+    
+    if cursor is not None:
+        return jsonify({
+            'items': posts_data,
+            'total': result['total'],
+            'page_size': result['page_size'],
+            'next_cursor': result['next_cursor']
         })
     
     return jsonify({
@@ -72,127 +113,125 @@ def get_posts_api():
         'page_size': result['page_size']
     })
 
-@posts_bp.route('/<int:post_id>', methods=['GET'])
-def get_post_detail(post_id):
-    post = Post.query.get(post_id)
-    if not post:
-        return jsonify({'error': '帖子不存在'}), 404
+@posts_bp.route('/search', methods=['GET'])
+def search_posts_api():
+    keyword = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = max(1, min(request.args.get('page_size', 10, type=int), 50))
+    category = request.args.get('category', type=int)
+    status = request.args.get('status') or None
     
-    # 检查权限：如果帖子未通过审核，只有作者或管理员可以查看
-    from flask import session
-    user_id = session.get('user_id')
-    if post.status != PostStatus.APPROVED and not (user_id and (user_id == post.author_id or post.author.is_admin)):
-        return jsonify({'error': '无权查看此帖子'}), 403
+    # 非管理员只能搜索已审核的帖子；管理员不传 status 时搜索全部，未知的 status 按已审核处理
+    principal = current_principal()
+    if not (principal and principal.is_admin):
+        status = PostStatus.APPROVED
+    elif status not in (None, PostStatus.PENDING, PostStatus.APPROVED, PostStatus.REJECTED):
+        status = PostStatus.APPROVED
     
-    # 增加浏览次数
-    post.views += 1
-    from app import db
-    db.session.commit()
+    if not keyword:
+        return jsonify({'error': '缺少搜索关键词'}), 400
     
-    # 获取点赞信息
-    from flask import session
-    user_id = session.get('user_id')
-    is_liked = False
-    likes_count = post.likes.count()
+    result = search_service.search_posts(keyword, page, page_size, category, status)
     
-    if user_id:
-        existing_like = PostLike.query.filter_by(user_id=user_id, post_id=post.id).first()
-        is_liked = existing_like is not None
+    items = []
+    for post, score in result['items']:
+        data = post_summary(post)
+        data['score'] = round(score, 4)
+        items.append(data)
     
     return jsonify({
-        'id': post.id,
-        'title': post.title,
-        'content_html': post.content_html,
-        'author_id': post.author_id,
-        'author_username': post.author.username,
-        'category_id': post.category_id,
-        'category_name': post.category.name,
-        'status': post.status,
-        'views': post.views,
-        'comments_count': post.comments.count(),
-        'likes_count': likes_count,
-        'is_liked': is_liked,
-        'created_at': post.created_at.isoformat(),
-        'updated_at': post.updated_at.isoformat()
+        'items': items,
+        'total': result['total'],
+        'page': result['page'],
+        'page_size': result['page_size']
     })
 
-@posts_bp.route('/<int:post_id>/like', methods=['POST'])
-@login_required
-def like_post(post_id):
-    post = Post.query.get(post_id)
-    if not post:
-        return jsonify({'error': '帖子不存在'}), 404
-    
+@posts_bp.route('/<int:post_id>', methods=['GET'])
+def get_post_detail(post_id):
     from flask import session
-    user_id = session['user_id']
+    user_id = session.get('user_id')
     
-    # 检查是否已经点赞
-    existing_like = PostLike.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if existing_like:
-        return jsonify({'error': '已经点赞过了'}), 400
+    # 条件请求：先用窄列查询计算校验值，命中时只记录浏览并返回 304
+    validator = db.session.query(
+        Post.updated_at, Post.status, Post.views, Post.comments_count, Post.likes_count, Category.name
+    ).join(Category, Category.id == Post.category_id).filter(Post.id == post_id).first()
+    etag = None
+    if validator is not None and validator.status == PostStatus.APPROVED:
+        is_liked = like_service.is_liked(user_id, 'post', post_id)
+        etag = make_etag((tuple(validator), is_liked, RENDERER_VERSION))
+        if is_not_modified(etag, validator.updated_at):
+            view_counter.record_view(post_id)
+            return set_validators(make_response('', 304), etag, validator.updated_at, public=not user_id, per_user=True)
     
-    # 创建点赞记录
-    new_like = PostLike(user_id=user_id, post_id=post_id)
-    db.session.add(new_like)
-    db.session.commit()
-
-    log(f'用户{session["user_id"]}点赞了帖子：{post.title}')
-
-    return jsonify({'message': '点赞成功'})
-
-@posts_bp.route('/<int:post_id>/like', methods=['DELETE'])
-@login_required
-def unlike_post(post_id):
-    post = Post.query.get(post_id)
-    if not post:
-        return jsonify({'error': '帖子不存在'}), 404
+    # 匿名访问时优先使用缓存的帖子数据（只有已审核的帖子会被缓存）
+    cache_key = None if user_id else request_cache_key()
+    data = response_cache.get(cache_key) if cache_key else None
     
-    from flask import session
-    user_id = session['user_id']
+    if data is None:
+        post = Post.query.get(post_id)
+        if not post or post.status == PostStatus.DELETED:
+            return jsonify({'error': '帖子不存在'}), 404
+        
+        # 检查权限：如果帖子未通过审核，只有作者或管理员可以查看
+        principal = current_principal()
+        if post.status != PostStatus.APPROVED and not (principal and (principal.id == post.author_id or principal.is_admin)):
+            return jsonify({'error': '无权查看此帖子'}), 403
+        
+        # 获取点赞信息
+        is_liked = like_service.is_liked(user_id, 'post', post.id)
+        
+        data = {
+            'id': post.id,
+            'title': post.title,
+            'content_html': rendered_html(post),
+            'author_id': post.author_id,
+            'author_username': post.author.username,
+            'category_id': post.category_id,
+            'category_name': post.category.name,
+            'status': post.status,
+            'views': post.views,
+            'comments_count': post.comments_count,
+            'likes_count': post.likes_count,
+            'is_liked': is_liked,
+            'created_at': post.created_at.isoformat(),
+            'updated_at': post.updated_at.isoformat()
+        }
+        if cache_key:
+            response_cache.set(cache_key, data, post_tags(post))
     
-    # 查找点赞记录
-    existing_like = PostLike.query.filter_by(user_id=user_id, post_id=post_id).first()
-    if not existing_like:
-        return jsonify({'error': '还没有点赞'}), 400
+    # 浏览次数先写入内存缓冲，由后台线程批量落库；返回值包含未落库的部分。
+    # 缓存中的浏览数在落库后不会更新，以数据库当前值为准，避免刷新后计数倒退
+    if validator is not None:
+        views = validator.views
+    else:
+        views = db.session.query(Post.views).filter(Post.id == post_id).scalar() or 0
+    data['views'] = views + view_counter.record_view(post_id)
     
-    # 删除点赞记录
-    db.session.delete(existing_like)
-    db.session.commit()
-
-    log(f'用户{session["user_id"]}取消点赞了帖子：{post.title}')
-
-    return jsonify({'message': '取消点赞成功'})
+    response = jsonify(data)
+    if etag is not None:
+        set_validators(response, etag, validator.updated_at, public=not user_id, per_user=True)
+    return response
 
 @posts_bp.route('/<int:post_id>', methods=['DELETE'])
 @admin_required
 def delete_post(post_id):
-    post = Post.query.get(post_id)
-    if not post:
+    post = db.session.query(Post.title, Post.status).filter(Post.id == post_id).first()
+    if not post or post.status == PostStatus.DELETED:
         return jsonify({'error': '帖子不存在'}), 404
     
-    # 先删除相关的点赞记录
-    from app.models import PostLike, Comment, CommentLike
-    PostLike.query.filter_by(post_id=post_id).delete()
-    
-    # 删除相关的评论及其点赞记录
-    comments = Comment.query.filter_by(post_id=post_id).all()
-    for comment in comments:
-        CommentLike.query.filter_by(comment_id=comment.id).delete()
-    Comment.query.filter_by(post_id=post_id).delete()
-    
-    # 删除帖子
-    db.session.delete(post)
-    db.session.commit()
+    # 评论和点赞少时用集合 DELETE 直接删除；大帖子先软删除，由后台任务分批清理
+    purged = deletion_service.delete_post(post_id)
+    response_cache.invalidate('posts', f'post:{post_id}', f'comments:{post_id}')
 
-    log(f'管理员删除了帖子：{post.title}')
+    log(f'管理员删除了帖子：{post.title}', action='delete_post', post_id=post_id)
 
-    return jsonify({'message': '帖子删除成功'})
+    return jsonify({'message': '帖子删除成功', 'purged': purged})
 
 @posts_bp.route('/<int:post_id>', methods=['PUT'])
 @admin_required
 def update_post(post_id):
     post = Post.query.get(post_id)
-    if not post:
+    if not post or post.status == PostStatus.DELETED:
         return jsonify({'error': '帖子不存在'}), 404
     
     data = request.json
@@ -205,6 +244,8 @@ def update_post(post_id):
         post.title = title
     if content_html:
         post.content_html = content_html
+        render_post(post)
+        upload_service.sync_references(post)
         # 更新摘要
         import re
         plain_text = re.sub(r'<[^<]+?>', '', content_html)
@@ -213,15 +254,20 @@ def update_post(post_id):
         post.category_id = category_id
     if status:
         post.status = status
+    ranking_service.sync_post(post)
+    search_service.update_post_fields(post)
+    if title or content_html:
+        enqueue('index_post', post_id=post.id)
     
     db.session.commit()
+    response_cache.invalidate('posts', f'post:{post_id}')
 
-    log(f'管理员更新了帖子：{post.title}')
+    log(f'管理员更新了帖子：{post.title}', action='update_post', post_id=post_id)
 
     return jsonify({
         'id': post.id,
         'title': post.title,
-        'content_html': post.content_html,
+        'content_html': rendered_html(post),
         'content_excerpt': post.content_excerpt,
         'author_id': post.author_id,
         'category_id': post.category_id,
@@ -1,44 +1,133 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, Response, current_app, request, jsonify, send_file
+import mimetypes
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+from app.services import upload_service
+from app.log import log
 from .auth import login_required
 
 upload_bp = Blueprint('upload', __name__, url_prefix='/api/upload')
 
-# 确保上传目录存在
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'upload')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
+# multipart 边界和字段头的额外开销，用于按 Content-Length 提前拒绝
+MULTIPART_OVERHEAD = 16 * 1024
+
+# 哈希文件名的内容永远不变，可以被浏览器和 CDN 长期缓存
+BLOB_MAX_AGE = 365 * 24 * 3600
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def too_large(max_bytes):
+    return jsonify({'error': f'文件不能超过 {max_bytes // (1024 * 1024)}MB'}), 413
+
 @upload_bp.route('/image', methods=['POST'])
 @login_required
 def upload_image():
-    """上传图片"""
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+    """上传图片：请求体分块写入临时文件并同时计算哈希，按内容哈希存储，重复上传不再占用空间"""
+    folder = current_app.config['UPLOAD_FOLDER']
+    max_bytes = current_app.config['UPLOAD_MAX_BYTES']
     
-    file = request.files['file']
+    # 声明的长度已经超限时不读取请求体
+    if request.content_length and request.content_length > max_bytes + MULTIPART_OVERHEAD:
+        return too_large(max_bytes)
     
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
-    
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
+    opened = []
+    try:
+        _, _, files = parse_form_data(
+            request.environ,
+            stream_factory=upload_service.stream_factory(os.path.join(folder, '.tmp'), max_bytes, opened),
+            max_content_length=max_bytes + MULTIPART_OVERHEAD,
+            silent=False,
+        )
+        
+        if 'file' not in files:
+            return jsonify({'error': 'No file part'}), 400
+        
+        file = files['file']
+        
+        if file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
         
-        # 返回图片URL，使用正确的域名
-        return jsonify({'url': f'https://tfms.fback.dcpstudios.top/api/upload/{filename}'}), 200
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        upload = file.stream
+        name, duplicate = upload_service.store(folder, upload)
+        if name is None:
+            return jsonify({'error': 'File type not allowed'}), 400
+    except RequestEntityTooLarge:
+        return too_large(max_bytes)
+    except ValueError:
+        return jsonify({'error': '无效的上传请求'}), 400
+    finally:
+        for target in opened:
+            target.discard()
+    
+    log(f'上传图片 {name}（{upload.size} 字节{"，重复文件" if duplicate else ""}）', action='upload_image', blob=name, size=upload.size, duplicate=duplicate)
     
-    return jsonify({'error': 'File type not allowed'}), 400
+    # 返回基于内容哈希的图片URL，内容不变 URL 就不变
+    return jsonify({
+        'url': f"{current_app.config['UPLOAD_URL_PREFIX']}/{name}",
+        'hash': upload.hexdigest,
+        'size': upload.size,
+        'duplicate': duplicate
+    }), 200
+
+def _offloaded(path, folder, mode):
+    """只返回响应头，由前端代理读取文件并处理 Range 等细节"""
+    response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, folder).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + relative
+    else:
+        response.headers['X-Sendfile'] = path
+    return response
 
 @upload_bp.route('/<path:filename>')
 def serve_file(filename):
-    """提供上传文件的访问"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """提供上传文件的访问
+
+    哈希文件名的内容不会变化：ETag 就是哈希本身，If-None-Match 命中时不访问磁盘直接返回 304，
+    并标记 immutable 长期缓存。配置为 x-accel / x-sendfile 时文件由前端代理发送，不占用 Python 进程。
+    """
+    folder = current_app.config['UPLOAD_FOLDER']
+    mode = current_app.config['UPLOAD_DELIVERY']
+    path = upload_service.blob_path(folder, filename)
+    immutable = path is not None
+    
+    if immutable:
+        digest = filename.split('.', 1)[0]
+        if digest in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(digest)
+            response.cache_control.public = True
+            response.cache_control.max_age = BLOB_MAX_AGE
+            response.cache_control.immutable = True
+            return response
+    else:
+        # 旧的按原文件名保存的图片；临时目录不对外
+        path = None if filename.startswith('.') else safe_join(folder, filename)
+    
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': '文件不存在'}), 404
+    
+    if mode in ('x-accel', 'x-sendfile'):
+        response = _offloaded(path, folder, mode)
+        if immutable:
+            response.set_etag(digest)
+    elif immutable:
+        # send_file 负责 Range 和条件请求
+        response = send_file(path, etag=digest, conditional=True, max_age=BLOB_MAX_AGE)
+    else:
+        response = send_file(path, conditional=True)
+    
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = BLOB_MAX_AGE
+        response.cache_control.immutable = True
+    return response
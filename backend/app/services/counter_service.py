@@ -0,0 +1,98 @@
+from app.models import Post, Comment, PostLike, CommentLike, User, Notification
+from app import db
+
+
+def increment_counter(model, obj_id, column, delta=1):
+    """原子更新计数列（col = col + delta），不提交事务，由调用方统一 commit
+
+    obj_id 可以是单个 id，也可以是 id 列表（同一条 UPDATE 批量更新）。
+    """
+    if isinstance(obj_id, (list, tuple, set)):
+        query = model.query.filter(model.id.in_(obj_id))
+    else:
+        query = model.query.filter(model.id == obj_id)
+    value = column + delta
+    if delta < 0:
+        # 避免计数被减成负数
+        value = db.case((value < 0, 0), else_=value)
+    # 显式保留 updated_at，计数变化不算内容更新
+    return query.update(
+        {column: value, model.updated_at: model.updated_at},
+        synchronize_session=False,
+    )
+
+
+def _reconcile(model, counters, batch_size):
+    """按主键分批重算计数，只更新有偏差的行，返回修正的行数
+
+    counters 为 (计数列, 明细表外键列[, 明细筛选条件]) 列表，如 (Post.likes_count, PostLike.post_id)
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(model.id, *[counter[0] for counter in counters])
+            .filter(model.id > last_id)
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        ids = [row[0] for row in rows]
+        actual = [
+            dict(
+                db.session.query(fk, db.func.count())
+                .filter(fk.in_(ids), *conditions)
+                .group_by(fk)
+                .all()
+            )
+            for _, fk, *conditions in counters
+        ]
+
+        for row in rows:
+            values = {}
+            for i, (column, *_) in enumerate(counters):
+                expected = actual[i].get(row[0], 0)
+                if row[i + 1] != expected:
+                    values[column] = expected
+            if values:
+                values[model.updated_at] = model.updated_at
+                model.query.filter(model.id == row[0]).update(values, synchronize_session=False)
+                fixed += 1
+
+        db.session.commit()
+        last_id = ids[-1]
+
+    return fixed
+
+
+def reconcile_post_counters(batch_size=500):
+    """重算帖子的评论数和点赞数"""
+    return _reconcile(
+        Post,
+        [
+            (Post.comments_count, Comment.post_id),
+            (Post.likes_count, PostLike.post_id),
+        ],
+        batch_size,
+    )
+
+
+def reconcile_comment_counters(batch_size=500):
+    """重算评论的点赞数"""
+    return _reconcile(
+        Comment,
+        [(Comment.likes_count, CommentLike.comment_id)],
+        batch_size,
+    )
+
+
+def reconcile_user_counters(batch_size=500):
+    """重算用户的未读通知数"""
+    return _reconcile(
+        User,
+        [(User.unread_notifications_count, Notification.user_id, Notification.is_read == False)],  # noqa: E712
+        batch_size,
+    )
@@ -0,0 +1,248 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from app.models import (
+    Post, PostStatus, Comment, PostLike, CommentLike, Notification, User,
+    PostHotScore, SearchDocument, SearchPosting, UploadReference,
+)
+from app import db
+from .counter_service import increment_counter
+from .job_queue import enqueue, task
+from . import ranking_service
+
+# 从属数据（评论、点赞、通知）不超过这么多行时在请求中直接删除，否则先软删除再由后台任务分批清理
+SYNC_LIMIT = 1000
+# 后台清理每批删除的行数，每批一个短事务，避免长时间锁住 comments 和 comment_likes
+BATCH_SIZE = 500
+# 后台任务每次执行的批数，之后重新入队，让出工作线程给其他任务
+BATCHES_PER_RUN = 20
+
+
+# 软删除用户后延迟这么多秒再开始清理，等其他进程缓存的登录身份过期，不再有该用户的新数据写入
+PURGE_USER_DELAY = 60
+
+
+def init_app(app):
+    global SYNC_LIMIT, BATCH_SIZE, PURGE_USER_DELAY
+    SYNC_LIMIT = app.config.get('DELETE_SYNC_LIMIT', 1000)
+    BATCH_SIZE = app.config.get('DELETE_BATCH_SIZE', 500)
+    PURGE_USER_DELAY = app.config.get('PRINCIPAL_CACHE_TTL', 60)
+
+
+def _count_up_to(query, limit):
+    """最多数到 limit + 1 行，用于判断数据量是否超过阈值而不做全量 COUNT"""
+    return db.session.query(query.limit(limit + 1).subquery()).count()
+
+
+def _batch_ids(column, condition, batch_size):
+    return [row_id for (row_id,) in db.session.query(column).filter(condition).order_by(column).limit(batch_size)]
+
+
+def _delete_rows(model, condition, batch_size=None):
+    """删除满足条件的行，batch_size 不为空时只删除一批，返回删除的行数"""
+    if batch_size is None:
+        return model.query.filter(condition).delete(synchronize_session=False)
+    ids = _batch_ids(model.id, condition, batch_size)
+    if not ids:
+        return 0
+    return model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+
+def _delete_comments(condition, batch_size=None):
+    """删除满足条件的评论及其点赞，返回删除的行数
+
+    分批时每次调用只删除一批：先按 batch_size 分批删完这批评论的点赞（热门评论的点赞可能很多），
+    再删除评论本身，返回 0 表示已全部删完。
+    """
+    if batch_size is None:
+        CommentLike.query.filter(
+            CommentLike.comment_id.in_(db.select(Comment.id).where(condition))
+        ).delete(synchronize_session=False)
+        return Comment.query.filter(condition).delete(synchronize_session=False)
+    ids = _batch_ids(Comment.id, condition, batch_size)
+    if not ids:
+        return 0
+    deleted = _delete_rows(CommentLike, CommentLike.comment_id.in_(ids), batch_size)
+    if deleted:
+        return deleted
+    return Comment.query.filter(Comment.id.in_(ids)).delete(synchronize_session=False)
+
+
+def _decrement(model, column, counts):
+    """按 {id: 数量} 减少计数，数量相同的 id 合并为一条 UPDATE"""
+    by_delta = defaultdict(list)
+    for obj_id, count in counts.items():
+        by_delta[count].append(obj_id)
+    for count, ids in by_delta.items():
+        increment_counter(model, ids, column, -count)
+
+
+def _take(model, group_column, condition, batch_size):
+    """选出要删除的行，返回 (删除条件, {group_column 的值: 行数})；batch_size 不为空时只取一批"""
+    if batch_size is None:
+        rows = db.session.query(group_column, db.func.count()).filter(condition).group_by(group_column)
+        return condition, Counter(dict(rows.all()))
+    rows = db.session.query(model.id, group_column).filter(condition).order_by(model.id).limit(batch_size).all()
+    return model.id.in_([row_id for row_id, _ in rows]), Counter(group for _, group in rows)
+
+
+def purge_posts(condition, batch_size=None):
+    """删除满足条件的帖子及其评论、点赞、热度、检索和上传引用，不提交事务
+
+    batch_size 为空时每张表一条集合 DELETE（WHERE post_id IN 子查询）一次删完；
+    否则每次调用只删除一批，返回 False 表示还有剩余，需提交后再次调用，全部删完时返回 True。
+    """
+    batched = batch_size is not None
+    post_ids = db.select(Post.id).where(condition)
+
+    if _delete_comments(Comment.post_id.in_(post_ids), batch_size) and batched:
+        return False
+    if _delete_rows(PostLike, PostLike.post_id.in_(post_ids), batch_size) and batched:
+        return False
+
+    if batched:
+        # 每篇帖子的检索词条可能有上百行，帖子本身按较小的批次删除
+        ids = _batch_ids(Post.id, condition, max(1, batch_size // 50))
+        if not ids:
+            return True
+        post_ids, condition = ids, Post.id.in_(ids)
+    for model in (PostHotScore, SearchPosting, SearchDocument, UploadReference):
+        model.query.filter(model.post_id.in_(post_ids)).delete(synchronize_session=False)
+    Post.query.filter(condition).delete(synchronize_session=False)
+    return not batched
+
+
+def purge_post(post_id, batch_size=None):
+    return purge_posts(Post.id == post_id, batch_size)
+
+
+def purge_user(user_id, batch_size=None):
+    """删除用户及其全部数据，不提交事务；batch_size 的含义同 purge_posts
+
+    用户在他人帖子下的评论和点赞被删除时，相应帖子和评论的计数同步减少。
+    """
+    batched = batch_size is not None
+
+    scope, counts = _take(CommentLike, CommentLike.comment_id, CommentLike.user_id == user_id, batch_size)
+    if counts:
+        CommentLike.query.filter(scope).delete(synchronize_session=False)
+        _decrement(Comment, Comment.likes_count, counts)
+        if batched:
+            return False
+
+    scope, counts = _take(PostLike, PostLike.post_id, PostLike.user_id == user_id, batch_size)
+    if counts:
+        PostLike.query.filter(scope).delete(synchronize_session=False)
+        _decrement(Post, Post.likes_count, counts)
+        ranking_service.record_events('like', {post_id: -count for post_id, count in counts.items()})
+        if batched:
+            return False
+
+    scope, counts = _take(Comment, Comment.post_id, Comment.author_id == user_id, batch_size)
+    if counts:
+        # 分批时先分批删完这批评论收到的点赞，再删评论并减少计数
+        comment_likes = CommentLike.comment_id.in_(db.select(Comment.id).where(scope))
+        if batched and _delete_rows(CommentLike, comment_likes, batch_size):
+            return False
+        _delete_comments(scope)
+        _decrement(Post, Post.comments_count, counts)
+        ranking_service.record_events('comment', {post_id: -count for post_id, count in counts.items()})
+        if batched:
+            return False
+
+    if not purge_posts(Post.author_id == user_id, batch_size):
+        return False
+    if _delete_rows(Notification, Notification.user_id == user_id, batch_size) and batched:
+        return False
+
+    User.query.filter_by(id=user_id).delete(synchronize_session=False)
+    return True
+
+
+def _hide_posts(condition):
+    """软删除帖子：帖子、热度行和检索文档一起标记为已删除，列表、排行和搜索中立即不再出现，不提交事务"""
+    post_ids = db.select(Post.id).where(condition)
+    for model in (PostHotScore, SearchDocument):
+        model.query.filter(model.post_id.in_(post_ids)).update(
+            {model.status: PostStatus.DELETED}, synchronize_session=False
+        )
+    Post.query.filter(condition).update(
+        {Post.status: PostStatus.DELETED, Post.updated_at: Post.updated_at}, synchronize_session=False
+    )
+
+
+def delete_post(post_id):
+    """删除帖子并提交事务
+
+    从属数据少时在当前事务中直接删除，返回 True；否则软删除并交给后台任务分批清理，返回 False。
+    """
+    thread_size = _count_up_to(Comment.query.filter(Comment.post_id == post_id), SYNC_LIMIT) + _count_up_to(
+        CommentLike.query.join(Comment, Comment.id == CommentLike.comment_id).filter(Comment.post_id == post_id),
+        SYNC_LIMIT,
+    ) + _count_up_to(PostLike.query.filter(PostLike.post_id == post_id), SYNC_LIMIT)
+
+    if thread_size <= SYNC_LIMIT:
+        purge_post(post_id)
+        db.session.commit()
+        return True
+
+    _hide_posts(Post.id == post_id)
+    enqueue('purge_post', post_id=post_id)
+    db.session.commit()
+    return False
+
+
+def delete_user(user_id):
+    """删除用户并提交事务，策略同 delete_post；软删除时用户立即不能登录，其帖子立即隐藏"""
+    own_posts = db.select(Post.id).where(Post.author_id == user_id)
+    # 会被连带删除的评论：用户自己的评论和其帖子下的评论，它们收到的点赞也要计入
+    affected_comments = db.select(Comment.id).where(
+        db.or_(Comment.author_id == user_id, Comment.post_id.in_(own_posts))
+    )
+    footprint = sum(
+        _count_up_to(query, SYNC_LIMIT) for query in (
+            Post.query.filter(Post.author_id == user_id),
+            Comment.query.filter(db.or_(Comment.author_id == user_id, Comment.post_id.in_(own_posts))),
+            PostLike.query.filter(db.or_(PostLike.user_id == user_id, PostLike.post_id.in_(own_posts))),
+            CommentLike.query.filter(
+                db.or_(CommentLike.user_id == user_id, CommentLike.comment_id.in_(affected_comments))
+            ),
+            Notification.query.filter(Notification.user_id == user_id),
+        )
+    )
+
+    if footprint <= SYNC_LIMIT:
+        purge_user(user_id)
+        db.session.commit()
+        return True
+
+    User.query.filter_by(id=user_id).update(
+        {User.deleted_at: datetime.utcnow()}, synchronize_session=False
+    )
+    _hide_posts(Post.author_id == user_id)
+    enqueue('purge_user', delay=PURGE_USER_DELAY, user_id=user_id)
+    db.session.commit()
+    return False
+
+
+def _purge_in_batches(purge, name, **payload):
+    """后台分批清理：每批一个事务，执行 BATCHES_PER_RUN 批后仍未完成则重新入队"""
+    for _ in range(BATCHES_PER_RUN):
+        done = purge(batch_size=BATCH_SIZE, **payload)
+        db.session.commit()
+        if done:
+            return
+    enqueue(name, **payload)
+    db.session.commit()
+
+
+@task('purge_post')
+def purge_post_job(post_id):
+    """后台任务：分批清理已软删除的帖子"""
+    _purge_in_batches(purge_post, 'purge_post', post_id=post_id)
+
+
+@task('purge_user')
+def purge_user_job(user_id):
+    """后台任务：分批清理已软删除的用户"""
+    _purge_in_batches(purge_user, 'purge_user', user_id=user_id)
@@ -0,0 +1,169 @@
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.models import Job
+from app import db
+
+# 任务名 -> 处理函数
+HANDLERS = {}
+
+# 重试退避：第 n 次失败后等待 RETRY_BASE * 2^(n-1) 秒（带抖动），最多 RETRY_MAX 秒
+RETRY_BASE = 2
+RETRY_MAX = 600
+# running 超过这么久（秒）视为工作线程已崩溃，重新放回队列
+STALE_AFTER = 300
+
+# 本进程有新任务提交时唤醒工作线程，其他进程的任务靠轮询发现
+_wakeup = threading.Event()
+_PENDING_KEY = 'jobs_enqueued'
+
+
+def task(name):
+    """注册任务处理函数，处理函数接收 payload 中的字段作为关键字参数，需自行提交事务"""
+    def decorator(func):
+        HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, max_attempts=5, delay=0, **payload):
+    """在当前事务中写入一个任务，随调用方的事务一起提交，不会丢也不会提前执行"""
+    job = Job(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay),
+    )
+    db.session.add(job)
+    db.session.info[_PENDING_KEY] = True
+    return job
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_workers(session):
+    if session.info.pop(_PENDING_KEY, False):
+        _wakeup.set()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_wakeup(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _claim():
+    """认领一个到期任务：条件 UPDATE 只有一个工作线程能成功，不依赖 SKIP LOCKED"""
+    now = datetime.utcnow()
+    candidates = [
+        job_id for (job_id,) in db.session.query(Job.id).filter(
+            Job.status == 'pending',
+            Job.run_at <= now,
+        ).order_by(Job.run_at).limit(10)
+    ]
+    for job_id in candidates:
+        claimed = Job.query.filter_by(id=job_id, status='pending').update(
+            {Job.status: 'running', Job.attempts: Job.attempts + 1, Job.locked_at: now},
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def _requeue_stale():
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+    Job.query.filter(Job.status == 'running', Job.locked_at < cutoff).update(
+        {Job.status: 'pending', Job.locked_at: None}, synchronize_session=False
+    )
+    db.session.commit()
+
+
+def run_job(job):
+    """执行已认领的任务：成功后删除，失败按退避重新排期，次数用完后标记为 dead"""
+    job_id, name, payload, attempts, max_attempts = job.id, job.name, job.payload, job.attempts, job.max_attempts
+    try:
+        handler = HANDLERS.get(name)
+        if handler is None:
+            raise LookupError(f'未注册的任务: {name}')
+        handler(**payload)
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc()
+        values = {Job.status: 'dead', Job.last_error: error, Job.locked_at: None}
+        if attempts < max_attempts:
+            values[Job.status] = 'pending'
+            values[Job.run_at] = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+        Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+        db.session.commit()
+        return False
+
+    Job.query.filter_by(id=job_id).delete(synchronize_session=False)
+    db.session.commit()
+    return True
+
+
+def run_pending(limit=None):
+    """在当前线程中执行到期任务，返回执行的个数；供脚本和单独的工作进程使用"""
+    count = 0
+    while limit is None or count < limit:
+        job = _claim()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def start_job_workers(app, workers=2, poll_interval=1.0):
+    """启动工作线程池，每个线程在自己的应用上下文中认领并执行任务"""
+    def run():
+        last_stale_check = 0
+        while True:
+            with app.app_context():
+                try:
+                    if time.monotonic() - last_stale_check > STALE_AFTER / 2:
+                        last_stale_check = time.monotonic()
+                        _requeue_stale()
+                    job = _claim()
+                    if job is not None:
+                        run_job(job)
+                        continue
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('job worker failed')
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+
+    threads = []
+    for index in range(workers):
+        thread = threading.Thread(target=run, name=f'job-worker-{index}', daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def dead_jobs(limit=100):
+    return Job.query.filter_by(status='dead').order_by(Job.id.desc()).limit(limit).all()
+
+
+def retry_dead(job_ids=None):
+    """把死信任务重新放回队列，返回数量"""
+    query = Job.query.filter_by(status='dead')
+    if job_ids:
+        query = query.filter(Job.id.in_(job_ids))
+    count = query.update(
+        {Job.status: 'pending', Job.attempts: 0, Job.run_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return count
@@ -0,0 +1,257 @@
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Post, PostStatus, Comment, PostLike, CommentLike
+from app import db
+from app.cache import response_cache
+from .counter_service import increment_counter
+from . import ranking_service
+
+# changed 表示本次请求是否改变了点赞状态，重复点赞或重复取消时为 False
+LikeResult = namedtuple('LikeResult', 'changed liked likes_count')
+
+# 点赞目标类型 -> 点赞表中的目标列
+KINDS = {
+    'post': PostLike.post_id,
+    'comment': CommentLike.comment_id,
+}
+# 每条缓存在数组之外的大致开销（字节），用于估算内存占用
+ENTRY_OVERHEAD = 256
+
+
+class LikedSetCache:
+    """每个用户点赞过的帖子和评论 id，存为有序的 int 数组，判断是否点赞只需二分查找
+
+    按用户 LRU 淘汰，总占用超过 max_bytes 时淘汰最久未用的用户；点赞数超过 max_per_user
+    的用户不缓存，直接查库。点赞和取消点赞时同步更新本进程的缓存，其他进程的条目最多保留 ttl 秒。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300, max_per_user=100000):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_per_user = max_per_user
+        self.size = 0
+        self._entries = OrderedDict()  # user_id -> [{kind: array}, expires_at, bytes]
+        # 正在加载的用户 -> 加载期间是否有点赞变化，有变化时不写入可能过期的结果
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            self._remove(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[0]
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def _load(self, user_id):
+        with self._lock:
+            # 同一用户并发加载时保留已有标记，宁可少缓存一次也不写入过期结果
+            self._loading.setdefault(user_id, False)
+
+        sets = {}
+        for kind, column in KINDS.items():
+            ids = [
+                target_id for (target_id,) in db.session.query(column).filter(
+                    column.class_.user_id == user_id
+                ).order_by(column).limit(self.max_per_user + 1)
+            ]
+            if len(ids) > self.max_per_user:
+                with self._lock:
+                    self._loading.pop(user_id, None)
+                return None
+            # 自增 id 不超过 2^31，用 4 字节整数保存
+            sets[kind] = array('i', ids)
+
+        nbytes = ENTRY_OVERHEAD + sum(sys.getsizeof(ids) for ids in sets.values())
+        with self._lock:
+            if self._loading.pop(user_id, True) or nbytes > self.max_bytes:
+                return sets
+            self._remove(user_id)
+            self._entries[user_id] = [sets, time.monotonic() + self.ttl, nbytes]
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return sets
+
+    def liked_ids(self, user_id, kind, ids):
+        """ids 中该用户点赞过的部分；用户点赞太多无法缓存时返回 None"""
+        with self._lock:
+            sets = self._get(user_id)
+        if sets is None:
+            sets = self._load(user_id)
+            if sets is None:
+                return None
+        liked = sets[kind]
+        result = set()
+        # 数组只会被整体替换，不会原地修改，锁外读取是安全的
+        for target_id in ids:
+            index = bisect_left(liked, target_id)
+            if index < len(liked) and liked[index] == target_id:
+                result.add(target_id)
+        return result
+
+    def update(self, user_id, kind, target_id, liked):
+        """点赞状态变化后更新缓存，未缓存的用户不做处理"""
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            sets = self._get(user_id)
+            if sets is None:
+                return
+            ids = sets[kind]
+            index = bisect_left(ids, target_id)
+            present = index < len(ids) and ids[index] == target_id
+            # 复制后整体替换，避免正在读取的线程看到修改中的数组
+            if liked and not present:
+                ids = array('i', ids)
+                insort(ids, target_id)
+            elif not liked and present:
+                ids = array('i', ids)
+                del ids[index]
+            else:
+                return
+            entry = self._entries[user_id]
+            sets = dict(sets, **{kind: ids})
+            nbytes = ENTRY_OVERHEAD + sum(sys.getsizeof(item) for item in sets.values())
+            self.size += nbytes - entry[2]
+            entry[0], entry[2] = sets, nbytes
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if user_id in self._loading:
+                self._loading[user_id] = True
+            self._remove(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+liked_cache = LikedSetCache()
+
+
+def init_app(app):
+    liked_cache.max_bytes = app.config.get('LIKE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    liked_cache.ttl = app.config.get('LIKE_CACHE_TTL', 300)
+    liked_cache.max_per_user = app.config.get('LIKE_CACHE_MAX_PER_USER', 100000)
+    liked_cache.clear()
+
+
+def liked_ids(user_id, kind, ids):
+    """给定的帖子或评论 id 中当前用户点赞过的集合，一次回答整页"""
+    ids = list(ids)
+    if not user_id or not ids:
+        return set()
+    result = liked_cache.liked_ids(user_id, kind, ids)
+    if result is not None:
+        return result
+    # 点赞数过多的用户不缓存，回退到 IN 查询
+    column = KINDS[kind]
+    return {
+        target_id for (target_id,) in db.session.query(column).filter(
+            column.class_.user_id == user_id, column.in_(ids)
+        )
+    }
+
+
+def is_liked(user_id, kind, target_id):
+    return target_id in liked_ids(user_id, kind, [target_id])
+
+
+def _insert_ignore(table, values):
+    """插入一行，违反唯一约束时什么也不做；返回是否插入了新行"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        statement = mysql.insert(table).values(**values).prefix_with('IGNORE')
+    elif dialect == 'postgresql':
+        statement = postgresql.insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table).values(**values).on_conflict_do_nothing()
+    else:
+        # 其他数据库用保存点兜底
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(**values))
+        except IntegrityError:
+            return False
+        return True
+    return db.session.execute(statement).rowcount > 0
+
+
+def _set_like(like_model, target_column, target_model, extra_columns, target_id, user_id, liked, alive=()):
+    """点赞或取消点赞，整个过程在一个事务中完成
+
+    依靠 (user_id, 目标 id) 的唯一索引保证不重复：点赞用 INSERT IGNORE，取消用带条件的 DELETE，
+    受影响行数即是否发生变化，只有变化时才更新计数。目标不存在或不满足 alive 条件
+    （所属帖子已软删除、等待后台清理）时返回 (None, None)，不写入任何数据。
+    """
+    if alive and db.session.query(target_model.id).filter(target_model.id == target_id, *alive).first() is None:
+        return None, None
+
+    if liked:
+        changed = _insert_ignore(like_model.__table__, {'user_id': user_id, target_column.key: target_id})
+    else:
+        changed = db.session.query(like_model).filter(
+            like_model.user_id == user_id, target_column == target_id
+        ).delete(synchronize_session=False) > 0
+
+    if changed and not increment_counter(target_model, target_id, target_model.likes_count, 1 if liked else -1):
+        # 目标不存在（SQLite 等不校验外键时点赞行仍会写入）
+        db.session.rollback()
+        return None, None
+
+    row = db.session.query(target_model.likes_count, *extra_columns).filter(target_model.id == target_id).first()
+    if row is None:
+        db.session.rollback()
+        return None, None
+    return LikeResult(changed, liked, row[0]), row
+
+
+def set_post_like(post_id, user_id, liked=True):
+    """点赞或取消点赞帖子，提交事务并返回 LikeResult；帖子不存在时返回 None"""
+    result, _ = _set_like(
+        PostLike, PostLike.post_id, Post, (), post_id, user_id, liked,
+        alive=(Post.status != PostStatus.DELETED,),
+    )
+    if result is None:
+        return None
+    if result.changed:
+        ranking_service.record_event(post_id, 'like', 1 if liked else -1)
+    db.session.commit()
+    # 未变化时也写一次，顺带纠正其他进程造成的过期状态
+    liked_cache.update(user_id, 'post', post_id, liked)
+    if result.changed:
+        response_cache.invalidate(f'post:{post_id}')
+    return result
+
+
+def set_comment_like(comment_id, user_id, liked=True):
+    """点赞或取消点赞评论，提交事务并返回 LikeResult；评论不存在时返回 None"""
+    post_alive = db.select(Post.id).where(Post.id == Comment.post_id, Post.status != PostStatus.DELETED).exists()
+    result, row = _set_like(
+        CommentLike, CommentLike.comment_id, Comment, (Comment.post_id,), comment_id, user_id, liked,
+        alive=(post_alive,),
+    )
+    if result is None:
+        return None
+    db.session.commit()
+    liked_cache.update(user_id, 'comment', comment_id, liked)
+    if result.changed:
+        response_cache.invalidate(f'comments:{row.post_id}')
+    return result
@@ -1,38 +1,126 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
 from app.models import Notification, User
 from app import db
+from app.log import log
+from app.pubsub import broker
+from .counter_service import increment_counter
+from .job_queue import task
+
+# 批量发送时每条 INSERT 包含的行数
+NOTIFICATION_BATCH_SIZE = 500
+
+# 本事务中收到新通知的用户，提交后统一推送
+_PENDING_KEY = 'notify_user_ids'
+
+
+def _publish_after_commit(user_ids):
+    db.session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
 
 
-def send_notification(user_id, title, content):
-    """发送站内信通知"""
+@event.listens_for(db.session, 'after_commit')
+def _publish_pending(session):
+    # 提交后再推送，推送通道读库时一定能看到这些通知
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        broker.publish(user_ids)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+@task('send_notification')
+def send_notification(user_id, title, content, commit=True):
+    """发送站内信通知，commit=False 时由调用方在同一事务中提交"""
     notification = Notification(
         user_id=user_id,
         title=title,
         content=content
     )
     db.session.add(notification)
-    db.session.commit()
+    increment_counter(User, user_id, User.unread_notifications_count)
+    _publish_after_commit([user_id])
+    if commit:
+        db.session.commit()
 
 
-def send_notification_to_admins(title, content):
+@task('send_bulk_notifications')
+def send_bulk_notifications(user_ids, title, content, commit=True, batch_size=NOTIFICATION_BATCH_SIZE):
+    """批量发送站内信：按批次多行 INSERT，整体在一个事务中提交
+
+    返回每个批次的行数和耗时（毫秒），同时写入日志。
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    created_at = datetime.utcnow()
+    timings = []
+
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        started = time.perf_counter()
+        db.session.execute(
+            Notification.__table__.insert(),
+            [
+                {'user_id': user_id, 'title': title, 'content': content, 'is_read': False, 'created_at': created_at}
+                for user_id in chunk
+            ],
+        )
+        increment_counter(User, chunk, User.unread_notifications_count)
+        _publish_after_commit(chunk)
+        timings.append({'rows': len(chunk), 'ms': round((time.perf_counter() - started) * 1000, 2)})
+
+    if commit:
+        started = time.perf_counter()
+        db.session.commit()
+        commit_ms = round((time.perf_counter() - started) * 1000, 2)
+    else:
+        commit_ms = None
+
+    if timings:
+        log(
+            f'批量发送站内信《{title}》：{len(user_ids)} 条，{len(timings)} 批',
+            action='bulk_notification', recipients=len(user_ids), batches=timings, commit_ms=commit_ms,
+        )
+    return timings
+
+
+@task('notify_admins')
+def send_notification_to_admins(title, content, commit=True):
     """给所有管理员发送通知"""
-    admins = User.query.filter_by(is_admin=True).all()
-    for admin in admins:
-        send_notification(admin.id, title, content)
+    admin_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+        User.is_admin.is_(True), User.deleted_at.is_(None)
+    )]
+    return send_bulk_notifications(admin_ids, title, content, commit=commit)
 
 
 def mark_notification_as_read(notification_id, user_id):
     """标记通知为已读"""
-    notification = Notification.query.filter_by(id=notification_id, user_id=user_id).first()
-    if notification:
-        notification.is_read = True
+    updated = Notification.query.filter_by(id=notification_id, user_id=user_id, is_read=False).update(
+        {Notification.is_read: True}, synchronize_session=False
+    )
+    if updated:
+        increment_counter(User, user_id, User.unread_notifications_count, -1)
         db.session.commit()
         return True
-    return False
+    # 已经是已读状态也视为成功
+    return db.session.query(Notification.id).filter_by(id=notification_id, user_id=user_id).first() is not None
 
 
 def mark_all_notifications_as_read(user_id):
-    """标记所有通知为已读"""
-    notifications = Notification.query.filter_by(user_id=user_id).all()
-    for notification in notifications:
-        notification.is_read = True
+    """标记所有通知为已读：一条 UPDATE 完成，未读数按实际更新的行数扣减"""
+    updated = Notification.query.filter_by(user_id=user_id, is_read=False).update(
+        {Notification.is_read: True}, synchronize_session=False
+    )
+    if updated:
+        increment_counter(User, user_id, User.unread_notifications_count, -updated)
     db.session.commit()
+    return updated
+
+
+def get_unread_count(user_id):
+    """获取用户的未读通知数（单行主键查询）"""
+    return db.session.query(User.unread_notifications_count).filter_by(id=user_id).scalar() or 0
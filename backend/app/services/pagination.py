@@ -0,0 +1,32 @@
+import base64
+import json
+from datetime import datetime
+
+from app import db
+
+
+def encode_cursor(sort_value, row_id):
+    """把 (排序键, id) 编码为不透明的游标字符串"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse_value=datetime.fromisoformat):
+    """解析游标，返回 (排序键, id)，格式不合法时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        return parse_value(sort_value), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('invalid cursor') from e
+
+
+def seek_after(sort_column, id_column, cursor, parse_value=datetime.fromisoformat):
+    """生成按 (排序键 desc, id desc) 定位到游标之后的过滤条件"""
+    last_value, last_id = decode_cursor(cursor, parse_value)
+    return db.or_(
+        sort_column < last_value,
+        db.and_(sort_column == last_value, id_column < last_id),
+    )
@@ -0,0 +1,143 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# 新密码使用的哈希参数，已存储的哈希参数不同时在登录成功后重新哈希
+HASH_METHOD = 'scrypt:32768:8:1'
+
+# 哈希子进程的 nice 值，CPU 紧张时优先保证 Web 进程处理其他请求
+WORKER_NICENESS = 10
+
+
+class PasswordPoolBusy(Exception):
+    """哈希进程池排队已满或等待超时，调用方应直接返回 503 让客户端稍后重试"""
+
+
+class PasswordHasher:
+    """在独立的进程池中计算密码哈希，避免占满 Web 进程的 CPU 拖慢其他请求
+
+    同时在途的任务数（执行中加排队）不超过 max_pending，超过时立即抛出 PasswordPoolBusy。
+    workers 为 0 或系统不支持 fork（Windows）时在当前线程中直接计算。
+    """
+
+    def __init__(self, workers=2, max_pending=8, timeout=10):
+        self.workers = workers if 'fork' in multiprocessing.get_all_start_methods() else 0
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.stats = {'completed': 0, 'rejected': 0}
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def run(self, func, *args, **kwargs):
+        if not self.workers:
+            return func(*args, **kwargs)
+
+        if not self._slots.acquire(blocking=False):
+            self.stats['rejected'] += 1
+            raise PasswordPoolBusy()
+        try:
+            pool, future = self._submit(func, args, kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        # 名额在任务真正结束时才归还：等待超时后任务仍在池中排队或执行，提前归还会让积压超过 max_pending
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.stats['rejected'] += 1
+            raise PasswordPoolBusy()
+        except BrokenProcessPool:
+            # 子进程被杀（例如 OOM）后整个池不再可用，换一个新池，本次请求让客户端稍后重试
+            self._discard(pool)
+            self.stats['rejected'] += 1
+            raise PasswordPoolBusy()
+        self.stats['completed'] += 1
+        return result
+
+    def _submit(self, func, args, kwargs):
+        """提交任务，返回 (进程池, future)；池已损坏或刚被替换时换新池重试一次"""
+        pool = self._executor()
+        try:
+            return pool, pool.submit(func, *args, **kwargs)
+        except RuntimeError:
+            # BrokenProcessPool 或池已被其他线程关闭
+            self._discard(pool)
+            pool = self._executor()
+            return pool, pool.submit(func, *args, **kwargs)
+
+    def start(self):
+        """提前创建并预热进程池
+
+        Web 进程应在启动任何后台线程之前调用；命令行脚本不调用，需要哈希时才创建。
+        """
+        if self.workers:
+            self._executor().submit(int).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _discard(self, pool):
+        """丢弃已损坏的进程池，下次使用时重新创建；其他线程已经替换过时什么也不做"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _executor(self):
+        # 用 fork 启动子进程（spawn 会在子进程中重新执行 main.py）；
+        # fork 时会一次性创建全部子进程，Web 进程由 start() 在后台线程启动之前完成，
+        # 其他情况（脚本、损坏后重建）在首次使用时创建
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('fork'),
+                        initializer=os.nice,
+                        initargs=(WORKER_NICENESS,),
+                    )
+        return self._pool
+
+
+hasher = PasswordHasher()
+atexit.register(lambda: hasher.shutdown())
+
+
+def init_app(app):
+    """根据配置重建哈希器，进程池在 start() 或首次使用时才创建，迁移等脚本不会 fork 子进程"""
+    global hasher
+    hasher.shutdown()
+    hasher = PasswordHasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_pending=app.config.get('PASSWORD_HASH_MAX_PENDING', 8),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
+
+
+def start_pool():
+    """预先创建进程池，由 Web 进程在启动后台线程之前调用"""
+    hasher.start()
+
+
+def hash_password(password):
+    return hasher.run(generate_password_hash, password, method=HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return hasher.run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """存储的哈希参数与当前配置不同（例如旧的 pbkdf2 或更低的迭代次数）"""
+    return password_hash.split('$', 1)[0] != HASH_METHOD
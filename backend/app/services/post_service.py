@@ -1,6 +1,17 @@
-from app.models import Post, PostStatus
+import time
+from datetime import datetime
+
+from sqlalchemy.orm import selectinload
+
+from app.models import Post, PostStatus, PostHotScore
 from app import db
-from .notification_service import send_notification, send_notification_to_admins
+from app.cache import response_cache
+from .job_queue import enqueue
+from .ranking_service import sync_post
+from . import search_service
+from .render_service import render_post
+from .upload_service import sync_references
+from .pagination import encode_cursor, seek_after
 
 
 def create_post(title, content_html, category_id, author_id):
@@ -19,15 +30,25 @@ def create_post(title, content_html, category_id, author_id):
         status=PostStatus.PENDING
     )
     
-    db.session.add(post)
-    db.session.commit()
+    # 正文只在写入时渲染一次，详情页直接返回缓存的 HTML
+    render_post(post)
     
-    # 给所有管理员发送通知
-    send_notification_to_admins(
-        "新帖子待审核",
-        f"用户 {post.author.username} 发布了新帖子《{post.title}》，等待审核。"
+    db.session.add(post)
+    db.session.flush()
+    sync_post(post)
+    sync_references(post)
+    
+    # 建索引和通知管理员放到后台任务，任务与帖子在同一事务中写入
+    enqueue('index_post', post_id=post.id)
+    enqueue(
+        'notify_admins',
+        title="新帖子待审核",
+        content=f"用户 {post.author.username} 发布了新帖子《{post.title}》，等待审核。",
     )
     
+    db.session.commit()
+    response_cache.invalidate('posts')
+    
     return post
 
 
@@ -38,15 +59,20 @@ def approve_post(post_id):
         return None
     
     post.status = PostStatus.APPROVED
-    db.session.commit()
-    
-    # 给作者发送通知
-    send_notification(
-        post.author_id,
-        "帖子审核通过",
-        f"你的帖子《{post.title}》已通过审核。"
+    sync_post(post)
+    search_service.update_post_fields(post)
+    
+    # 给作者的通知由后台任务发送，任务与状态变更在同一事务中写入
+    enqueue(
+        'send_notification',
+        user_id=post.author_id,
+        title="帖子审核通过",
+        content=f"你的帖子《{post.title}》已通过审核。",
     )
     
+    db.session.commit()
+    response_cache.invalidate('posts', f'post:{post.id}')
+    
     return post
 
 
@@ -57,46 +83,126 @@ def reject_post(post_id, reason=""):
         return None
     
     post.status = PostStatus.REJECTED
-    db.session.commit()
+    sync_post(post)
+    search_service.update_post_fields(post)
     
-    # 给作者发送通知
+    # 给作者的通知由后台任务发送，任务与状态变更在同一事务中写入
     content = f"你的帖子《{post.title}》未通过审核。"
     if reason:
         content += f" 原因：{reason}"
     
-    send_notification(
-        post.author_id,
-        "帖子审核未通过",
-        content
-    )
+    enqueue('send_notification', user_id=post.author_id, title="帖子审核未通过", content=content)
+    
+    db.session.commit()
+    response_cache.invalidate('posts', f'post:{post.id}')
     
     return post
 
 
-def get_posts(page=1, page_size=10, category=None, status=None, sort=None):
-    """获取帖子列表"""
+# 各排序方式对应的排序键，统一以帖子 id 作为第二排序键保证顺序稳定
+SORT_KEYS = {
+    'latest': Post.created_at,
+    'hot': PostHotScore.score,
+}
+
+# 游标模式下的总数估算缓存：{(category, status): (total, expires_at)}
+TOTAL_ESTIMATE_TTL = 60
+# 缓存条目上限，超过时先清掉过期条目，仍然超过则整体清空
+TOTAL_ESTIMATE_MAX_ENTRIES = 1000
+LISTING_STATUSES = (PostStatus.PENDING, PostStatus.APPROVED, PostStatus.REJECTED, PostStatus.DELETED)
+_total_estimates = {}
+
+
+def estimate_total(category=None, status=None):
+    """按分类/状态缓存的帖子总数，短时间内可能略有偏差"""
+    if status and status not in LISTING_STATUSES:
+        # 未知状态不会匹配任何帖子，也不写入缓存，避免任意参数让缓存无限增长
+        return 0
+
+    key = (category, status)
+    cached = _total_estimates.get(key)
+    now = time.monotonic()
+    if cached and cached[1] > now:
+        return cached[0]
+
     query = Post.query
-    
     if category:
         query = query.filter_by(category_id=category)
-    
     if status:
         query = query.filter_by(status=status)
+    else:
+        query = query.filter(Post.status != PostStatus.DELETED)
+    total = query.order_by(None).count()
+
+    if len(_total_estimates) >= TOTAL_ESTIMATE_MAX_ENTRIES:
+        for stale in [item for item, entry in _total_estimates.items() if entry[1] <= now]:
+            _total_estimates.pop(stale, None)
+        if len(_total_estimates) >= TOTAL_ESTIMATE_MAX_ENTRIES:
+            _total_estimates.clear()
+    _total_estimates[key] = (total, now + TOTAL_ESTIMATE_TTL)
+    return total
+
+
+def _listing_query(query, sort_key, category=None, status=None, cursor=None):
+    """给查询加上帖子列表的筛选、游标和排序条件"""
+    if sort_key is PostHotScore.score:
+        # hot 走热度表的 (category_id, status, score) 索引
+        query = query.join(PostHotScore, PostHotScore.post_id == Post.id)
+        filter_model, id_column = PostHotScore, PostHotScore.post_id
+    else:
+        filter_model, id_column = Post, Post.id
     
-    if sort == 'latest':
-        query = query.order_by(Post.created_at.desc())
-    elif sort == 'hot':
-        # 简单的热门排序，按评论数
-        query = query.outerjoin(Post.comments).group_by(Post.id).order_by(db.func.count(Post.comments).desc())
+    if category:
+        query = query.filter(filter_model.category_id == category)
+    
+    if status:
+        query = query.filter(filter_model.status == status)
     else:
-        query = query.order_by(Post.created_at.desc())
+        # 已删除、等待清理的帖子不出现在列表中
+        query = query.filter(filter_model.status != PostStatus.DELETED)
+    
+    if cursor:
+        parse_value = datetime.fromisoformat if sort_key is Post.created_at else float
+        query = query.filter(seek_after(sort_key, id_column, cursor, parse_value))
     
-    total = query.count()
-    posts = query.offset((page - 1) * page_size).limit(page_size).all()
+    return query.order_by(sort_key.desc(), id_column.desc())
+
+
+def get_posts(page=1, page_size=10, category=None, status=None, sort=None, cursor=None):
+    """获取帖子列表
+
+    sort=hot 时按热度表排序：帖子创建时即建立热度行，缺失的行由定期衰减任务补建。
+    传入 cursor（首屏传空字符串）时使用游标分页：按 (排序键, id) 定位下一页，
+    不再执行 OFFSET 和全量 COUNT，total 为缓存的估算值。
+    """
+    # 作者和分类按页批量加载，避免逐条懒加载；排序键随结果一起取出，用于生成游标
+    sort_key = SORT_KEYS.get(sort, Post.created_at)
+    query = Post.query.options(selectinload(Post.author), selectinload(Post.category)).add_columns(sort_key)
+    query = _listing_query(query, sort_key, category, status, cursor)
+    
+    if cursor is None:
+        total = query.count()
+        rows = query.offset((page - 1) * page_size).limit(page_size).all()
+        
+        return {
+            'items': [post for post, _ in rows],
+            'total': total,
+            'page': page,
+            'page_size': page_size
+        }
+    
+    # 多取一条用于判断是否还有下一页
+    rows = query.limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last_post, last_value = rows[-1]
+        next_cursor = encode_cursor(last_value, last_post.id)
     
     return {
-        'items': posts,
-        'total': total,
-        'page': page,
-        'page_size': page_size
+        'items': [post for post, _ in rows],
+        'total': estimate_total(category, status),
+        'page_size': page_size,
+        'next_cursor': next_cursor
     }
+
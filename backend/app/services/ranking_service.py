@@ -0,0 +1,206 @@
+from datetime import datetime
+
+from app.models import Job, Post, PostHotScore
+from app import db
+from .job_queue import enqueue, task
+
+# 各类互动对热度的权重
+EVENT_WEIGHTS = {
+    'comment': 3.0,
+    'like': 2.0,
+    'view': 0.1,
+}
+
+# 衰减参数：score = engagement / (小时数 + OFFSET) ^ GRAVITY
+GRAVITY = 1.5
+AGE_OFFSET_HOURS = 2.0
+
+
+def decay_factor(created_at, now=None):
+    """根据发布时间计算衰减系数"""
+    now = now or datetime.utcnow()
+    age_hours = max((now - created_at).total_seconds() / 3600, 0)
+    return 1.0 / (age_hours + AGE_OFFSET_HOURS) ** GRAVITY
+
+
+def compute_engagement(comments_count, likes_count, views):
+    return (
+        comments_count * EVENT_WEIGHTS['comment']
+        + likes_count * EVENT_WEIGHTS['like']
+        + views * EVENT_WEIGHTS['view']
+    )
+
+
+def sync_post(post):
+    """创建或同步帖子的热度行（分类、状态变化时调用），不提交事务"""
+    row = PostHotScore.query.get(post.id)
+    if row is None:
+        engagement = compute_engagement(post.comments_count or 0, post.likes_count or 0, post.views or 0)
+        row = PostHotScore(
+            post_id=post.id,
+            post_created_at=post.created_at,
+            engagement=engagement,
+            score=engagement * decay_factor(post.created_at),
+        )
+        db.session.add(row)
+    row.category_id = post.category_id
+    row.status = post.status
+    return row
+
+
+def remove_post(post_id):
+    """删除帖子的热度行，不提交事务"""
+    PostHotScore.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+
+def record_event(post_id, event, count=1):
+    """增量记录一次互动（comment/like/view），count 可为负数表示撤销，不提交事务"""
+    created_at = db.session.query(PostHotScore.post_created_at).filter_by(post_id=post_id).scalar()
+    if created_at is None:
+        return 0
+
+    weight = EVENT_WEIGHTS[event] * count
+    engagement = PostHotScore.engagement + weight
+    return PostHotScore.query.filter_by(post_id=post_id).update(
+        {
+            PostHotScore.engagement: engagement,
+            PostHotScore.score: engagement * decay_factor(created_at),
+        },
+        synchronize_session=False,
+    )
+
+
+def record_events(event, counts):
+    """批量记录同一类互动，counts 为 {post_id: 次数}，一条 UPDATE 完成，不提交事务"""
+    if not counts:
+        return 0
+
+    rows = (
+        db.session.query(PostHotScore.post_id, PostHotScore.post_created_at)
+        .filter(PostHotScore.post_id.in_(list(counts)))
+        .all()
+    )
+    if not rows:
+        return 0
+
+    now = datetime.utcnow()
+    weights = {post_id: EVENT_WEIGHTS[event] * counts[post_id] for post_id, _ in rows}
+    factors = {post_id: decay_factor(created_at, now) for post_id, created_at in rows}
+    engagement = PostHotScore.engagement + db.case(weights, value=PostHotScore.post_id, else_=0)
+    return PostHotScore.query.filter(PostHotScore.post_id.in_(list(weights))).update(
+        {
+            PostHotScore.engagement: engagement,
+            PostHotScore.score: engagement * db.case(factors, value=PostHotScore.post_id, else_=0),
+        },
+        synchronize_session=False,
+    )
+
+
+def _age_hours(column, now, dialect):
+    """发布至今的小时数（SQL 表达式），日期运算各数据库写法不同"""
+    now = db.literal(now, db.DateTime)
+    if dialect == 'sqlite':
+        return (db.func.julianday(now) - db.func.julianday(column)) * 24
+    if dialect == 'postgresql':
+        return db.extract('epoch', now - column) / 3600.0
+    return db.func.timestampdiff(db.literal_column('SECOND'), column, now) / 3600.0
+
+
+def decay_expression(created_at, now, dialect):
+    """与 decay_factor 相同的衰减系数（SQL 表达式），用于集合 UPDATE"""
+    age = _age_hours(created_at, now, dialect)
+    age = db.case((age < 0, 0.0), else_=age)
+    return 1.0 / db.func.power(age + AGE_OFFSET_HOURS, GRAVITY)
+
+
+def backfill_statement(dialect, now=None):
+    """为还没有热度行的帖子补建热度行的 INSERT ... SELECT，热度按计数列计算"""
+    now = now or datetime.utcnow()
+    engagement = compute_engagement(Post.comments_count, Post.likes_count, Post.views)
+    missing = db.select(
+        Post.id, Post.category_id, Post.status, Post.created_at, engagement,
+        engagement * decay_expression(Post.created_at, now, dialect), db.literal(now, db.DateTime),
+    ).outerjoin(PostHotScore, PostHotScore.post_id == Post.id).where(PostHotScore.post_id.is_(None))
+    return db.insert(PostHotScore).from_select(
+        ['post_id', 'category_id', 'status', 'post_created_at', 'engagement', 'score', 'updated_at'], missing
+    )
+
+
+def recompute_statement(dialect, now=None):
+    """按帖子计数列重新计算全部热度行的互动分和热度的 UPDATE，用于计数被修正之后"""
+    now = now or datetime.utcnow()
+    engagement = db.select(
+        compute_engagement(Post.comments_count, Post.likes_count, Post.views)
+    ).where(Post.id == PostHotScore.post_id).scalar_subquery()
+    return db.update(PostHotScore).values(
+        engagement=engagement,
+        score=engagement * decay_expression(PostHotScore.post_created_at, now, dialect),
+    )
+
+
+def backfill_hot_scores():
+    """补建缺失的热度行，返回补建的行数；sort=hot 只列出有热度行的帖子，缺行的帖子会从热榜中消失"""
+    dialect = db.session.get_bind().dialect.name
+    added = db.session.execute(backfill_statement(dialect)).rowcount
+    db.session.commit()
+    return added
+
+
+def redecay_scores():
+    """用一条 UPDATE 重新计算整张热度表的衰减后热度，返回处理的行数
+
+    先补建缺失的热度行，即使有帖子漏建了热度行，也最多一个衰减周期后回到热榜。
+    """
+    backfill_hot_scores()
+    dialect = db.session.get_bind().dialect.name
+    factor = decay_expression(PostHotScore.post_created_at, datetime.utcnow(), dialect)
+    processed = PostHotScore.query.update(
+        {PostHotScore.score: PostHotScore.engagement * factor},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return processed
+
+
+def rebuild_hot_scores(batch_size=500):
+    """根据帖子的计数列重建整张热度表，用于初始化或修复"""
+    rebuilt = 0
+    last_id = 0
+    while True:
+        posts = Post.query.filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not posts:
+            break
+
+        ids = [post.id for post in posts]
+        PostHotScore.query.filter(PostHotScore.post_id.in_(ids)).delete(synchronize_session=False)
+        for post in posts:
+            sync_post(post)
+        db.session.commit()
+
+        rebuilt += len(posts)
+        last_id = ids[-1]
+
+    return rebuilt
+
+
+@task('redecay_hot_scores')
+def redecay_job(interval):
+    """后台任务：重新衰减热度，然后安排下一次；队列中始终只保留一个待执行的衰减任务"""
+    redecay_scores()
+    Job.query.filter_by(name='redecay_hot_scores', status='pending').delete(synchronize_session=False)
+    enqueue('redecay_hot_scores', delay=interval, interval=interval)
+    db.session.commit()
+
+
+def schedule_decay(app, interval=600):
+    """把定期衰减交给任务队列，多个 Web 进程同时启动也只有一个工作线程在执行
+
+    队列中已有衰减任务时不再提交；并发启动偶尔多提交的任务会在下一次执行时被合并。
+    """
+    with app.app_context():
+        exists = db.session.query(Job.id).filter(
+            Job.name == 'redecay_hot_scores', Job.status.in_(['pending', 'running'])
+        ).first()
+        if exists is None:
+            enqueue('redecay_hot_scores', delay=interval, interval=interval)
+            db.session.commit()
@@ -0,0 +1,175 @@
+import hashlib
+import html
+import re
+from html.parser import HTMLParser
+
+from app.models import Post
+from app import db
+
+# 渲染规则变化时加一，所有帖子会在下次访问或运行 render_posts.py 时重新渲染
+RENDERER_VERSION = 1
+
+# 编辑器（Quill）会产生的标签和属性，其余一律丢弃
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'strong', 'b', 'em', 'i', 'u', 's', 'strike', 'sub', 'sup',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'code',
+    'ul', 'ol', 'li', 'a', 'img', 'span',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+ALLOWED_ATTRS = {
+    'a': {'href', 'target'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'li': {'data-list'},
+}
+# 连同内容一起丢弃的标签
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+
+LOOKS_LIKE_HTML = re.compile(r'<[a-zA-Z!/]')
+SAFE_URL = re.compile(r'^(https?://|/|mailto:)', re.IGNORECASE)
+SAFE_IMAGE_DATA = re.compile(r'^data:image/(png|jpeg|gif|webp);base64,[a-z0-9+/=\s]+$', re.IGNORECASE)
+SAFE_CLASS = re.compile(r'^ql-[a-z0-9-]+$')
+SAFE_STYLE = re.compile(r'^\s*(color|background-color)\s*:\s*(#[0-9a-f]{3,8}|rgba?\([\d\s.,%]+\))\s*$', re.IGNORECASE)
+
+
+class _Sanitizer(HTMLParser):
+    """按白名单重建 HTML，保证标签闭合、属性转义"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.stack = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+
+        cleaned = []
+        for name, value in attrs:
+            value = value or ''
+            if name in ALLOWED_ATTRS.get(tag, ()):
+                if name == 'href' and not SAFE_URL.match(value.strip()):
+                    continue
+                if name == 'src' and not (SAFE_URL.match(value.strip()) or SAFE_IMAGE_DATA.match(value)):
+                    continue
+                if name == 'target' and value != '_blank':
+                    continue
+                cleaned.append((name, value))
+            elif name == 'class':
+                classes = [item for item in value.split() if SAFE_CLASS.match(item)]
+                if classes:
+                    cleaned.append(('class', ' '.join(classes)))
+            elif name == 'style':
+                styles = [item for item in value.split(';') if SAFE_STYLE.match(item)]
+                if styles:
+                    cleaned.append(('style', ';'.join(item.strip() for item in styles)))
+        if tag == 'a' and any(name == 'target' for name, _ in cleaned):
+            cleaned.append(('rel', 'noopener noreferrer nofollow'))
+
+        attributes = ''.join(f' {name}="{html.escape(value, quote=True)}"' for name, value in cleaned)
+        self.out.append(f'<{tag}{attributes}>')
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self.stack and self.stack[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping or tag not in self.stack:
+            return
+        # 关闭到匹配的标签为止，中间未闭合的标签一并关闭
+        while self.stack:
+            open_tag = self.stack.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        while self.stack:
+            self.out.append(f'</{self.stack.pop()}>')
+        return ''.join(self.out)
+
+
+def render(source):
+    """把帖子正文渲染为可以直接插入页面的安全 HTML
+
+    编辑器提交的是 HTML，按白名单清洗；不含标签的纯文本按空行分段、换行转为 <br>。
+    """
+    source = source or ''
+    if not LOOKS_LIKE_HTML.search(source):
+        paragraphs = [part for part in re.split(r'\n\s*\n', source.strip()) if part]
+        return ''.join(
+            '<p>' + html.escape(part, quote=False).replace('\n', '<br>') + '</p>' for part in paragraphs
+        )
+    sanitizer = _Sanitizer()
+    sanitizer.feed(source)
+    return sanitizer.result()
+
+
+def render_key(source):
+    """缓存键：正文内容和渲染器版本的哈希"""
+    return hashlib.sha256(f'{RENDERER_VERSION}\0{source or ""}'.encode('utf-8')).hexdigest()
+
+
+def render_post(post):
+    """写入时渲染并保存到缓存列，不提交事务"""
+    post.content_rendered = render(post.content_markdown)
+    post.rendered_hash = render_key(post.content_markdown)
+
+
+def rendered_html(post):
+    """读取时使用缓存的渲染结果；缺失或过期（正文或渲染器变化）时补渲染并保存"""
+    key = render_key(post.content_markdown)
+    if post.rendered_hash == key and post.content_rendered is not None:
+        return post.content_rendered
+
+    rendered = render(post.content_markdown)
+    # 只更新缓存列，不改变 updated_at
+    Post.query.filter_by(id=post.id).update(
+        {Post.content_rendered: rendered, Post.rendered_hash: key, Post.updated_at: Post.updated_at},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return rendered
+
+
+def backfill(batch_size=200):
+    """按 id 分批补齐缺失或过期的渲染结果，返回重新渲染的帖子数"""
+    rendered = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Post.id, Post.content_markdown, Post.rendered_hash).filter(
+            Post.id > last_id
+        ).order_by(Post.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        for row in rows:
+            key = render_key(row.content_markdown)
+            if row.rendered_hash == key:
+                continue
+            Post.query.filter_by(id=row.id).update(
+                {
+                    Post.content_rendered: render(row.content_markdown),
+                    Post.rendered_hash: key,
+                    Post.updated_at: Post.updated_at,
+                },
+                synchronize_session=False,
+            )
+            rendered += 1
+        db.session.commit()
+    return rendered
@@ -0,0 +1,184 @@
+import html
+import math
+import re
+from collections import Counter
+
+from sqlalchemy.orm import selectinload
+
+from app.models import Post, PostStatus, SearchDocument, SearchPosting
+from app import db
+from .job_queue import task
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+# 标题中的词项按该倍数计入词频
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 32
+MAX_QUERY_TERMS = 32
+
+TAG_RE = re.compile(r'<[^>]+>')
+# Markdown 图片、链接地址以及常见标记符号
+MARKDOWN_RE = re.compile(r'!\[[^\]]*\]\([^)]*\)|\]\([^)]*\)|[#>*_`~\[\]|]')
+CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+
+
+def strip_markup(text):
+    """去掉 HTML 标签和 Markdown 标记，返回纯文本"""
+    text = TAG_RE.sub(' ', text or '')
+    text = MARKDOWN_RE.sub(' ', text)
+    return html.unescape(text)
+
+
+def tokenize(text, for_query=False):
+    """分词：中文按单字和相邻二元组切分，英文数字按单词切分
+
+    查询时连续中文只取二元组（单个汉字取单字），以减少噪声匹配。
+    """
+    tokens = []
+    for run in TOKEN_RE.findall(strip_markup(text).lower()):
+        if not CJK_RE.fullmatch(run):
+            tokens.append(run[:MAX_TERM_LENGTH])
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if for_query and bigrams:
+            tokens.extend(bigrams)
+        else:
+            tokens.extend(run)
+            tokens.extend(bigrams)
+    return tokens
+
+
+def index_post(post):
+    """重建单篇帖子的索引条目，不提交事务"""
+    terms = Counter(tokenize(post.content_markdown))
+    for term in tokenize(post.title):
+        terms[term] += TITLE_WEIGHT
+
+    SearchPosting.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+    if terms:
+        db.session.execute(
+            SearchPosting.__table__.insert(),
+            [{'term': term, 'post_id': post.id, 'tf': tf} for term, tf in terms.items()],
+        )
+
+    document = SearchDocument.query.get(post.id)
+    if document is None:
+        document = SearchDocument(post_id=post.id)
+        db.session.add(document)
+    document.category_id = post.category_id
+    document.status = post.status
+    document.length = sum(terms.values())
+
+
+@task('index_post')
+def index_post_job(post_id):
+    """后台任务：帖子创建或编辑后重建其索引，帖子已删除时跳过"""
+    post = db.session.get(Post, post_id)
+    if post is not None:
+        index_post(post)
+        db.session.commit()
+
+
+def update_post_fields(post):
+    """只同步分类和状态（审核通过/拒绝时内容不变），不提交事务"""
+    SearchDocument.query.filter_by(post_id=post.id).update(
+        {SearchDocument.category_id: post.category_id, SearchDocument.status: post.status},
+        synchronize_session=False,
+    )
+
+
+def remove_post(post_id):
+    """删除帖子的索引条目，不提交事务"""
+    SearchPosting.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+    SearchDocument.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+
+def rebuild_index(batch_size=200):
+    """清空并重建整个索引，返回索引的帖子数"""
+    SearchPosting.query.delete(synchronize_session=False)
+    SearchDocument.query.delete(synchronize_session=False)
+    db.session.commit()
+
+    indexed = 0
+    last_id = 0
+    while True:
+        posts = Post.query.filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not posts:
+            break
+        for post in posts:
+            index_post(post)
+        db.session.commit()
+
+        indexed += len(posts)
+        last_id = posts[-1].id
+
+    return indexed
+
+
+def search_posts(keyword, page=1, page_size=10, category=None, status=None):
+    """按 BM25 相关度检索帖子"""
+    terms = list(dict.fromkeys(tokenize(keyword, for_query=True)))[:MAX_QUERY_TERMS]
+    result = {'items': [], 'total': 0, 'page': page, 'page_size': page_size}
+    if not terms:
+        return result
+
+    doc_count, avg_length = db.session.query(
+        db.func.count(SearchDocument.post_id), db.func.avg(SearchDocument.length)
+    ).one()
+    if not doc_count:
+        return result
+    avg_length = float(avg_length) or 1.0
+
+    # 每个词项的文档频率，计算 idf
+    doc_freqs = dict(
+        db.session.query(SearchPosting.term, db.func.count(SearchPosting.post_id))
+        .filter(SearchPosting.term.in_(terms))
+        .group_by(SearchPosting.term)
+        .all()
+    )
+    if not doc_freqs:
+        return result
+    idf = {
+        term: math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+        for term, df in doc_freqs.items()
+    }
+
+    tf = SearchPosting.tf
+    length_norm = K1 * (1 - B + B * SearchDocument.length / avg_length)
+    score = db.func.sum(
+        db.case(idf, value=SearchPosting.term, else_=0) * tf * (K1 + 1) / (tf + length_norm)
+    ).label('score')
+
+    query = (
+        db.session.query(SearchPosting.post_id, score)
+        .join(SearchDocument, SearchDocument.post_id == SearchPosting.post_id)
+        .filter(SearchPosting.term.in_(list(doc_freqs)))
+    )
+    if category:
+        query = query.filter(SearchDocument.category_id == category)
+    if status:
+        query = query.filter(SearchDocument.status == status)
+    else:
+        # 已删除、等待清理的帖子不出现在搜索结果中
+        query = query.filter(SearchDocument.status != PostStatus.DELETED)
+    query = query.group_by(SearchPosting.post_id)
+
+    total = query.order_by(None).count()
+    rows = (
+        query.order_by(score.desc(), SearchPosting.post_id.desc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+        .all()
+    )
+
+    posts = {
+        post.id: post
+        for post in Post.query.options(selectinload(Post.author), selectinload(Post.category))
+        .filter(Post.id.in_([post_id for post_id, _ in rows]))
+    }
+    result['items'] = [(posts[post_id], score) for post_id, score in rows if post_id in posts]
+    result['total'] = total
+    return result
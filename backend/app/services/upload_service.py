@@ -0,0 +1,287 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.models import Post, PostStatus, UploadReference
+from app import db
+
+# 按文件头识别图片类型，扩展名以实际内容为准而不是客户端提供的文件名
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+# 内容寻址的文件名：sha256 + 扩展名
+BLOB_NAME = re.compile(r'^([0-9a-f]{64})\.(png|jpg|gif)$')
+# 正文中对上传文件的引用：只匹配文件名本身，不依赖 UPLOAD_URL_PREFIX（可能改为 CDN 域名）；
+# 误匹配只会让文件多保留，不会误删
+BLOB_REF = re.compile(r'(?<![0-9a-f])([0-9a-f]{64}\.(?:png|jpg|gif))(?![0-9A-Za-z])')
+
+CHUNK_SIZE = 64 * 1024
+
+# 进程的 umask，导入时读取一次（读取需要临时修改，运行中修改会影响其他线程）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+class HashingFile:
+    """上传文件的落盘目标：边写入临时文件边计算 sha256，超过大小上限立即中止"""
+
+    def __init__(self, tmp_dir, max_bytes):
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b''
+        self._sha256 = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=tmp_dir, prefix='upload-', delete=False)
+        self.path = self._file.name
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge()
+        if len(self.head) < 16:
+            self.head += data[:16 - len(self.head)]
+        self._sha256.update(data)
+        return self._file.write(data)
+
+    # 表单解析器写完后会回到开头，这里只需转发给底层文件
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        return self._file.flush()
+
+    @property
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def stream_factory(tmp_dir, max_bytes, opened):
+    """给 werkzeug 表单解析器使用的文件流工厂，创建的文件记录在 opened 中便于清理"""
+    def factory(total_content_length, content_type, filename, content_length=None):
+        target = HashingFile(tmp_dir, max_bytes)
+        opened.append(target)
+        return target
+    return factory
+
+
+def sniff_extension(head):
+    for signature, extension in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def blob_path(folder, name):
+    """内容寻址文件的存储路径，按哈希前两位分目录；name 不是哈希文件名时返回 None"""
+    match = BLOB_NAME.match(name)
+    if not match:
+        return None
+    return os.path.join(folder, match.group(1)[:2], name)
+
+
+def store(folder, upload):
+    """把已写完的临时文件按内容哈希存入上传目录
+
+    返回 (文件名, 是否为已存在的重复文件)；内容相同的文件只保存一份。
+    """
+    extension = sniff_extension(upload.head)
+    if extension is None:
+        upload.discard()
+        return None, False
+
+    name = f'{upload.hexdigest}.{extension}'
+    path = blob_path(folder, name)
+    upload.close()
+    if os.path.exists(path):
+        # 刷新修改时间，避免刚被重复上传的文件在宽限期内被清理
+        os.utime(path)
+        upload.discard()
+        return name, True
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 临时文件的权限是 0600，改为普通文件的权限，否则以其他用户运行的 nginx/Apache 无法经
+    # X-Accel-Redirect / X-Sendfile 发送
+    os.chmod(upload.path, 0o644 & ~_UMASK)
+    # 同一文件系统内的 rename 是原子的，并发上传同一文件时结果也一致
+    os.replace(upload.path, path)
+    return name, False
+
+
+def extract_blobs(content):
+    """正文中引用的内容寻址文件名"""
+    return set(BLOB_REF.findall(content or ''))
+
+
+def sync_references(post):
+    """按当前正文重建帖子的上传引用，不提交事务"""
+    UploadReference.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+    blobs = extract_blobs(post.content_markdown)
+    if blobs:
+        db.session.execute(
+            UploadReference.__table__.insert(),
+            [{'blob': blob, 'post_id': post.id} for blob in blobs],
+        )
+
+
+def remove_references(post_id):
+    """删除帖子的上传引用，不提交事务"""
+    UploadReference.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+
+def rebuild_references(batch_size=200):
+    """按 id 分批从正文重建全部引用，返回处理的帖子数"""
+    count = 0
+    last_id = 0
+    while True:
+        posts = Post.query.filter(Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not posts:
+            break
+        last_id = posts[-1].id
+        for post in posts:
+            sync_references(post)
+        db.session.commit()
+        count += len(posts)
+    return count
+
+
+def _referenced(blobs, rejected_retention):
+    """给定文件中仍被引用的部分；被拒绝超过保留期的帖子不再算作引用"""
+    if not blobs:
+        return set()
+    query = db.session.query(UploadReference.blob).join(Post, Post.id == UploadReference.post_id).filter(
+        UploadReference.blob.in_(blobs)
+    )
+    if rejected_retention is not None:
+        cutoff = datetime.utcnow() - timedelta(seconds=rejected_retention)
+        query = query.filter(db.or_(Post.status != PostStatus.REJECTED, Post.updated_at >= cutoff))
+    return {blob for (blob,) in query.distinct()}
+
+
+def _shards(folder):
+    try:
+        return sorted(name for name in os.listdir(folder) if re.match(r'^[0-9a-f]{2}$', name))
+    except FileNotFoundError:
+        return []
+
+
+def collect_garbage(folder, grace=86400, rate=50, max_shards=None, rejected_retention=None):
+    """清理没有被任何帖子引用、且超过宽限期未修改的上传文件
+
+    按分片目录增量进行，进度记录在 .gc-state 中，下次从上次结束的位置继续；
+    每秒最多删除 rate 个文件，避免集中的磁盘 I/O。旧的按原文件名保存的图片不在清理范围内。
+    返回 {'scanned', 'deleted', 'freed_bytes', 'shards'}。
+    """
+    state_path = os.path.join(folder, '.gc-state')
+    try:
+        with open(state_path) as handle:
+            last_shard = handle.read().strip()
+    except FileNotFoundError:
+        last_shard = ''
+
+    shards = _shards(folder)
+    pending = [shard for shard in shards if shard > last_shard] or shards
+    if max_shards:
+        pending = pending[:max_shards]
+
+    stats = {'scanned': 0, 'deleted': 0, 'freed_bytes': 0, 'shards': len(pending)}
+    interval = 1.0 / rate if rate else 0
+    now = time.time()
+
+    for shard in pending:
+        directory = os.path.join(folder, shard)
+        candidates = {}
+        for entry in os.scandir(directory):
+            if entry.is_file() and BLOB_NAME.match(entry.name):
+                stats['scanned'] += 1
+                stat = entry.stat()
+                if now - stat.st_mtime > grace:
+                    candidates[entry.name] = stat.st_size
+
+        orphans = set(candidates) - _referenced(list(candidates), rejected_retention)
+        for name in sorted(orphans):
+            path = os.path.join(directory, name)
+            try:
+                # 删除前再确认一次：期间可能被重新上传（会刷新修改时间）
+                if time.time() - os.stat(path).st_mtime <= grace:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            stats['deleted'] += 1
+            stats['freed_bytes'] += candidates[name]
+            if interval:
+                time.sleep(interval)
+
+        with open(state_path, 'w') as handle:
+            handle.write('' if shard == shards[-1] else shard)
+
+    # 上传中断留下的临时文件
+    tmp_dir = os.path.join(folder, '.tmp')
+    if os.path.isdir(tmp_dir):
+        for entry in os.scandir(tmp_dir):
+            if entry.is_file() and now - entry.stat().st_mtime > grace:
+                os.remove(entry.path)
+
+    return stats
+
+
+def disk_usage(folder, rejected_retention=None):
+    """上传目录的占用情况：内容寻址文件（区分是否被引用）、旧文件和临时文件的数量与字节数"""
+    report = {
+        name: {'files': 0, 'bytes': 0}
+        for name in ('referenced', 'unreferenced', 'legacy', 'tmp')
+    }
+
+    for shard in _shards(folder):
+        sizes = {
+            entry.name: entry.stat().st_size
+            for entry in os.scandir(os.path.join(folder, shard))
+            if entry.is_file() and BLOB_NAME.match(entry.name)
+        }
+        referenced = _referenced(list(sizes), rejected_retention)
+        for name, size in sizes.items():
+            bucket = report['referenced' if name in referenced else 'unreferenced']
+            bucket['files'] += 1
+            bucket['bytes'] += size
+
+    if os.path.isdir(folder):
+        for entry in os.scandir(folder):
+            if entry.is_file() and not entry.name.startswith('.'):
+                report['legacy']['files'] += 1
+                report['legacy']['bytes'] += entry.stat().st_size
+    tmp_dir = os.path.join(folder, '.tmp')
+    if os.path.isdir(tmp_dir):
+        for entry in os.scandir(tmp_dir):
+            if entry.is_file():
+                report['tmp']['files'] += 1
+                report['tmp']['bytes'] += entry.stat().st_size
+    return report
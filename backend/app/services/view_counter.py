@@ -0,0 +1,94 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from app.models import Post
+from app import db
+from . import ranking_service
+
+# 进程内待写入的浏览次数：{post_id: 增量}
+_pending = defaultdict(int)
+_lock = threading.Lock()
+_flush_requested = threading.Event()
+_flusher = None
+
+FLUSH_THRESHOLD = 500
+
+
+def record_view(post_id):
+    """记录一次浏览，只写内存，返回该帖子尚未落库的浏览数"""
+    with _lock:
+        _pending[post_id] += 1
+        pending = _pending[post_id]
+        total = len(_pending)
+
+    if total >= FLUSH_THRESHOLD:
+        if _flusher is not None:
+            _flush_requested.set()
+        else:
+            # 没有后台线程时在当前请求内落库
+            flush()
+    return pending
+
+
+def pending_views(post_id):
+    """获取帖子尚未落库的浏览数"""
+    with _lock:
+        return _pending.get(post_id, 0)
+
+
+def flush():
+    """把缓冲的浏览数合并成一条 UPDATE 写入数据库，需要在应用上下文中调用
+
+    每个进程只写自己的增量（views = views + n），多进程同时刷新也不会丢失计数。
+    """
+    global _pending
+    with _lock:
+        if not _pending:
+            return 0
+        counts, _pending = _pending, defaultdict(int)
+
+    try:
+        Post.query.filter(Post.id.in_(list(counts))).update(
+            {
+                Post.views: Post.views + db.case(counts, value=Post.id, else_=0),
+                Post.updated_at: Post.updated_at,
+            },
+            synchronize_session=False,
+        )
+        ranking_service.record_events('view', counts)
+        # 不失效响应缓存：列表缓存带有其中每篇帖子的标签，每次刷新都失效会让缓存形同虚设，
+        # 缓存中的浏览数最多落后一个 TTL
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # 写入失败时放回缓冲区，等待下次刷新
+        with _lock:
+            for post_id, count in counts.items():
+                _pending[post_id] += count
+        raise
+    return len(counts)
+
+
+def start_view_flusher(app, interval=5, threshold=500):
+    """启动后台线程，按时间间隔或缓冲区大小刷新浏览数，进程退出前再刷新一次"""
+    global _flusher, FLUSH_THRESHOLD
+    FLUSH_THRESHOLD = threshold
+
+    def flush_in_context():
+        with app.app_context():
+            try:
+                flush()
+            except Exception:
+                app.logger.exception('view counter flush failed')
+
+    def run():
+        while True:
+            _flush_requested.wait(interval)
+            _flush_requested.clear()
+            flush_in_context()
+
+    _flusher = threading.Thread(target=run, name='view-counter-flush', daemon=True)
+    _flusher.start()
+    atexit.register(flush_in_context)
+    return _flusher
@@ -0,0 +1,101 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+
+def request(url, data=None):
+    """发送一次请求，返回 (状态码, 耗时毫秒)"""
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = 0
+    return status, (time.perf_counter() - started) * 1000
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def probe(url, stop, latencies, interval):
+    """持续请求一个非登录接口，记录延迟"""
+    while not stop.is_set():
+        status, ms = request(url)
+        if status == 200:
+            latencies.append(ms)
+        time.sleep(interval)
+
+
+def storm(url, identifier, password, count, results):
+    for _ in range(count):
+        results.append(request(url, {'identifier': identifier, 'password': password}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="登录风暴下的登录吞吐量和普通接口延迟")
+    parser.add_argument("base_url", help="后端地址，例如 http://localhost:5007")
+    parser.add_argument("--user", required=True, help="用于登录的用户名或邮箱")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200, help="登录请求总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发登录线程数")
+    parser.add_argument("--probe-path", default="/api/categories", help="测量延迟的非登录接口")
+    parser.add_argument("--probe-seconds", type=float, default=3, help="登录风暴前测量基线的时长")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    probe_url = base_url + args.probe_path
+    login_url = base_url + "/api/auth/login"
+
+    # 基线：没有登录请求时普通接口的延迟
+    stop = threading.Event()
+    baseline = []
+    thread = threading.Thread(target=probe, args=(probe_url, stop, baseline, 0.01))
+    thread.start()
+    time.sleep(args.probe_seconds)
+    stop.set()
+    thread.join()
+
+    # 登录风暴期间同时测量普通接口
+    stop = threading.Event()
+    during = []
+    prober = threading.Thread(target=probe, args=(probe_url, stop, during, 0.01))
+    prober.start()
+
+    results = []
+    per_thread = max(1, args.logins // args.concurrency)
+    workers = [
+        threading.Thread(target=storm, args=(login_url, args.user, args.password, per_thread, results))
+        for _ in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    statuses = Counter(status for status, _ in results)
+    login_ms = [ms for status, ms in results if status == 200]
+    print(f"logins: {len(results)} in {elapsed:.2f}s, {statuses[200] / elapsed:.1f} successful/s, statuses {dict(statuses)}")
+    print(f"login latency: p50 {percentile(login_ms, 50):.1f}ms, p99 {percentile(login_ms, 99):.1f}ms")
+    print(f"{args.probe_path} baseline: p50 {percentile(baseline, 50):.1f}ms, p99 {percentile(baseline, 99):.1f}ms ({len(baseline)} requests)")
+    print(f"{args.probe_path} during storm: p50 {percentile(during, 50):.1f}ms, p99 {percentile(during, 99):.1f}ms ({len(during)} requests)")
+
+
+if __name__ == "__main__":
+    main()
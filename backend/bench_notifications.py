@@ -0,0 +1,142 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from bench_login import percentile, probe
+
+
+def login(base_url, identifier, password):
+    """登录并返回 (会话 Cookie, 用户 id)"""
+    req = urllib.request.Request(
+        base_url + "/api/auth/login",
+        data=json.dumps({"identifier": identifier, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=30) as response:
+        cookie = "; ".join(value.split(";", 1)[0] for value in response.headers.get_all("Set-Cookie") or [])
+        data = json.loads(response.read())
+    return cookie, data["id"]
+
+
+class Stream(threading.Thread):
+    """一个空闲的 SSE 连接，记录建立结果、心跳数和第一条通知到达的时间"""
+
+    def __init__(self, base_url, cookie, opened):
+        super().__init__(daemon=True)
+        self.url = urllib.parse.urlsplit(base_url)
+        self.cookie = cookie
+        self.opened = opened
+        self.status = None
+        self.heartbeats = 0
+        self.received_at = None
+        self.received = threading.Event()
+
+    def run(self):
+        connection_class = http.client.HTTPSConnection if self.url.scheme == "https" else http.client.HTTPConnection
+        connection = connection_class(self.url.netloc, timeout=300)
+        try:
+            connection.request("GET", "/api/notifications/stream", headers={
+                "Cookie": self.cookie, "Accept": "text/event-stream",
+            })
+            response = connection.getresponse()
+            self.status = response.status
+            self.opened.release()
+            if response.status != 200:
+                return
+            while True:
+                line = response.fp.readline()
+                if not line:
+                    break
+                if line.startswith(b": heartbeat"):
+                    self.heartbeats += 1
+                elif line.startswith(b"event: notification") and self.received_at is None:
+                    self.received_at = time.perf_counter()
+                    self.received.set()
+        except OSError:
+            if self.status is None:
+                self.status = 0
+                self.opened.release()
+        finally:
+            connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="大量空闲推送连接下的资源占用、普通接口延迟和通知送达延迟")
+    parser.add_argument("base_url", help="后端地址，例如 http://localhost:5007")
+    parser.add_argument("--user", required=True, help="建立推送连接的用户名或邮箱")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--admin", required=True, help="用于发送站内信的管理员")
+    parser.add_argument("--admin-password", required=True)
+    parser.add_argument("--connections", type=int, default=200, help="同时保持的推送连接数")
+    parser.add_argument("--idle-seconds", type=float, default=10, help="连接全部建立后保持空闲的时长")
+    parser.add_argument("--probe-path", default="/api/categories", help="测量延迟的普通接口")
+    parser.add_argument("--probe-seconds", type=float, default=3, help="建立连接前测量基线的时长")
+    args = parser.parse_args()
+
+    base_url = args.base_url.rstrip("/")
+    probe_url = base_url + args.probe_path
+    cookie, user_id = login(base_url, args.user, args.password)
+    admin_cookie, _ = login(base_url, args.admin, args.admin_password)
+
+    # 基线：没有推送连接时普通接口的延迟
+    stop = threading.Event()
+    baseline = []
+    thread = threading.Thread(target=probe, args=(probe_url, stop, baseline, 0.01))
+    thread.start()
+    time.sleep(args.probe_seconds)
+    stop.set()
+    thread.join()
+
+    # 建立全部推送连接
+    opened = threading.Semaphore(0)
+    streams = [Stream(base_url, cookie, opened) for _ in range(args.connections)]
+    started = time.perf_counter()
+    for stream in streams:
+        stream.start()
+    for _ in streams:
+        opened.acquire()
+    open_seconds = time.perf_counter() - started
+    connected = [stream for stream in streams if stream.status == 200]
+    rejected = sum(1 for stream in streams if stream.status == 503)
+
+    # 连接空闲期间测量普通接口
+    stop = threading.Event()
+    during = []
+    prober = threading.Thread(target=probe, args=(probe_url, stop, during, 0.01))
+    prober.start()
+    time.sleep(args.idle_seconds)
+    stop.set()
+    prober.join()
+
+    # 发送一条站内信，测量送达全部连接的延迟
+    req = urllib.request.Request(
+        base_url + "/api/notifications/send",
+        data=json.dumps({"user_ids": [user_id], "title": "bench", "content": "bench"}).encode(),
+        headers={"Content-Type": "application/json", "Cookie": admin_cookie},
+    )
+    sent_at = time.perf_counter()
+    try:
+        urllib.request.urlopen(req, timeout=30).read()
+    except urllib.error.HTTPError as error:
+        print(f"send failed: {error.code}")
+    deadline = sent_at + 30
+    for stream in connected:
+        stream.received.wait(max(0, deadline - time.perf_counter()))
+    delivery_ms = [(stream.received_at - sent_at) * 1000 for stream in connected if stream.received_at is not None]
+
+    print(f"streams: {len(connected)} open, {rejected} rejected (503), "
+          f"{len(streams) - len(connected) - rejected} failed, opened in {open_seconds:.2f}s")
+    print(f"heartbeats while idle: {sum(stream.heartbeats for stream in connected)}")
+    print(f"delivery: {len(delivery_ms)}/{len(connected)} streams, "
+          f"p50 {percentile(delivery_ms, 50):.1f}ms, p99 {percentile(delivery_ms, 99):.1f}ms")
+    print(f"{args.probe_path} baseline: p50 {percentile(baseline, 50):.1f}ms, p99 {percentile(baseline, 99):.1f}ms ({len(baseline)} requests)")
+    print(f"{args.probe_path} with idle streams: p50 {percentile(during, 50):.1f}ms, p99 {percentile(during, 99):.1f}ms ({len(during)} requests)")
+
+
+if __name__ == "__main__":
+    main()
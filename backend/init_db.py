@@ -1,4 +1,5 @@
 from app import create_app, db  # type: ignore
+from app.migrations import stamp
 
 
 def init_db() -> None:
@@ -7,6 +8,8 @@ def init_db() -> None:
         # 先删除所有表，然后重新创建，确保表结构更新
         db.drop_all()
         db.create_all()
+        # 新建的表已是最新结构，记为最新版本；已有数据的库请用 migrate.py 升级
+        stamp()
         print("Database tables dropped and recreated.")
 
 
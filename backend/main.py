@@ -1,9 +1,35 @@
+import os
+
 from app import create_app
+from app.services.ranking_service import schedule_decay
+from app.services.view_counter import start_view_flusher
+from app.services.job_queue import start_job_workers
+from app.services.password_service import start_pool
 
 app = create_app()
 
 
+def start_background_services():
+    # 密码哈希进程池要在启动任何后台线程之前 fork
+    start_pool()
+
+    if app.config["HOT_SCORE_DECAY_INTERVAL"] > 0:
+        # 衰减由任务队列中的单个任务执行，不在每个 Web 进程中各跑一遍
+        schedule_decay(app, app.config["HOT_SCORE_DECAY_INTERVAL"])
+
+    start_view_flusher(app, app.config["VIEW_FLUSH_INTERVAL"], app.config["VIEW_FLUSH_THRESHOLD"])
+
+    if app.config["JOB_WORKERS"] > 0:
+        start_job_workers(app, app.config["JOB_WORKERS"], app.config["JOB_POLL_INTERVAL"])
+
+
+# 开发服务器的 reloader 父进程只负责监视文件并重启子进程，也会执行本模块；
+# 后台服务只在实际处理请求的子进程（WERKZEUG_RUN_MAIN=true）或 WSGI 服务器中启动，
+# 否则父进程认领的任务会推送到没有订阅者的进程内 pubsub
+if __name__ != "__main__" or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+    start_background_services()
+
+
 if __name__ == "__main__":
     # 开发环境运行
     app.run(host="0.0.0.0", port=5007, debug=True)
-
@@ -0,0 +1,44 @@
+import sys
+
+from app import create_app  # type: ignore
+from app.migrations import MIGRATIONS, check_plans, current_version, head, stamp, upgrade
+
+
+def migrate(command="upgrade") -> None:
+    app = create_app()
+    with app.app_context():
+        if command == "--status":
+            version = current_version()
+            for item in MIGRATIONS:
+                mark = "x" if item.version <= version else " "
+                print(f"[{mark}] {item.version:3d} {item.description}")
+            print(f"Schema version {version}, latest {head()}.")
+            return
+
+        if command == "--stamp":
+            # 库由 create_all() 建成、已经是最新结构时，只记录版本号
+            stamp()
+            print(f"Schema stamped at version {head()}.")
+            return
+
+        if command == "--check":
+            # 检查主要查询的执行计划是否使用了对应的索引
+            failed = 0
+            for label, index, ok, plan in check_plans():
+                print(f"{'ok  ' if ok else 'FAIL'} {label}: {index}")
+                if not ok:
+                    failed += 1
+                    print("     " + plan.replace("\n", "\n     "))
+            sys.exit(1 if failed else 0)
+
+        # 就地升级：只加表、列和索引，不删除已有数据
+        applied = upgrade(int(command) if command.isdigit() else None)
+        for item in applied:
+            print(f"Applied {item.version}: {item.description}")
+            if item.follow_up:
+                print(f"    then run: {item.follow_up}")
+        print(f"Schema at version {current_version()}.")
+
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else "upgrade")
@@ -0,0 +1,21 @@
+import sys
+
+from app import create_app  # type: ignore
+from app.services.ranking_service import rebuild_hot_scores, redecay_scores
+
+
+def main(rebuild=False) -> None:
+    app = create_app()
+    with app.app_context():
+        if rebuild:
+            # 根据帖子计数列重建整张热度表
+            count = rebuild_hot_scores()
+            print(f"Hot scores rebuilt for {count} posts.")
+        else:
+            # 只重新计算衰减，适合放在 cron 中定期执行
+            count = redecay_scores()
+            print(f"Hot scores re-decayed for {count} posts.")
+
+
+if __name__ == "__main__":
+    main("--rebuild" in sys.argv[1:])
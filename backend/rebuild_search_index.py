@@ -0,0 +1,14 @@
+from app import create_app  # type: ignore
+from app.services.search_service import rebuild_index
+
+
+def main() -> None:
+    app = create_app()
+    with app.app_context():
+        # 清空倒排索引并按帖子逐批重建
+        count = rebuild_index()
+        print(f"Search index rebuilt for {count} posts.")
+
+
+if __name__ == "__main__":
+    main()
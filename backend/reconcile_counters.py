@@ -0,0 +1,18 @@
+import sys
+
+from app import create_app  # type: ignore
+from app.services.counter_service import reconcile_post_counters, reconcile_comment_counters, reconcile_user_counters
+
+
+def reconcile_counters(batch_size=500) -> None:
+    app = create_app()
+    with app.app_context():
+        # 离线重算冗余计数列，修正并发或历史数据造成的偏差
+        posts_fixed = reconcile_post_counters(batch_size)
+        comments_fixed = reconcile_comment_counters(batch_size)
+        users_fixed = reconcile_user_counters(batch_size)
+        print(f"Counters reconciled: {posts_fixed} posts, {comments_fixed} comments, {users_fixed} users fixed.")
+
+
+if __name__ == "__main__":
+    reconcile_counters(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,16 @@
+import sys
+
+from app import create_app  # type: ignore
+from app.services.render_service import backfill
+
+
+def render_posts(batch_size=200) -> None:
+    app = create_app()
+    with app.app_context():
+        # 补齐缺失或过期的正文渲染缓存，未补齐的帖子也会在首次访问时渲染
+        count = backfill(batch_size)
+        print(f"Rendered HTML refreshed for {count} posts.")
+
+
+if __name__ == "__main__":
+    render_posts(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
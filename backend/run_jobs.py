@@ -0,0 +1,30 @@
+import sys
+import time
+
+from app import create_app  # type: ignore
+from app.services.job_queue import dead_jobs, retry_dead, start_job_workers
+
+
+def main(args) -> None:
+    app = create_app()
+    if "--dead" in args:
+        # 列出死信任务
+        with app.app_context():
+            for job in dead_jobs():
+                error = (job.last_error or "").strip().splitlines()[-1:] or [""]
+                print(f"#{job.id} {job.name} attempts={job.attempts} {error[0]}")
+    elif "--retry" in args:
+        # 重新排队死信任务，可指定 id，不指定则全部
+        job_ids = [int(arg) for arg in args if arg.isdigit()]
+        with app.app_context():
+            print(f"{retry_dead(job_ids)} dead jobs requeued.")
+    else:
+        # 独立的工作进程，此时可把 Web 进程的 TFMSFORUM_JOB_WORKERS 设为 0
+        start_job_workers(app, app.config["JOB_WORKERS"] or 1, app.config["JOB_POLL_INTERVAL"])
+        print("Job workers started.")
+        while True:
+            time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
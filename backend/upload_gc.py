@@ -0,0 +1,40 @@
+import sys
+
+from app import create_app  # type: ignore
+from app.services.upload_service import collect_garbage, disk_usage, rebuild_references
+
+
+def upload_gc(mode="gc") -> None:
+    app = create_app()
+    with app.app_context():
+        folder = app.config["UPLOAD_FOLDER"]
+        retention = app.config.get("UPLOAD_GC_REJECTED_RETENTION")
+
+        if mode == "--reindex":
+            # 按帖子正文重建引用表，上线本功能或手工修改数据后运行一次
+            count = rebuild_references()
+            print(f"Upload references rebuilt for {count} posts.")
+            return
+
+        if mode == "--report":
+            report = disk_usage(folder, retention)
+            for name, usage in report.items():
+                print(f"{name}: {usage['files']} files, {usage['bytes'] / 1024 / 1024:.1f} MB")
+            return
+
+        # 增量清理：每次处理一部分分片目录，可以由 cron 定期运行
+        stats = collect_garbage(
+            folder,
+            grace=app.config.get("UPLOAD_GC_GRACE", 24 * 3600),
+            rate=app.config.get("UPLOAD_GC_RATE", 50),
+            max_shards=int(sys.argv[2]) if len(sys.argv) > 2 else 16,
+            rejected_retention=retention,
+        )
+        print(
+            f"Upload GC: scanned {stats['scanned']} files in {stats['shards']} shards, "
+            f"deleted {stats['deleted']} ({stats['freed_bytes'] / 1024 / 1024:.1f} MB freed)."
+        )
+
+
+if __name__ == "__main__":
+    upload_gc(sys.argv[1] if len(sys.argv) > 1 else "gc")
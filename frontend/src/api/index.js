@@ -30,7 +30,7 @@ export const postApi = {
 
 // 评论相关接口
 export const commentApi = {
-  getList: (postId) => api.get(`/posts/${postId}/comments`),
+  getList: (postId, params) => api.get(`/posts/${postId}/comments`, { params }),
   create: (postId, data) => api.post(`/posts/${postId}/comments`, data),
   delete: (id) => api.delete(`/comments/${id}`)
 };
@@ -38,6 +38,11 @@ export const commentApi = {
 // 通知相关接口
 export const notificationApi = {
   getList: (params) => api.get('/notifications', { params }),
+  getUnreadCount: () => api.get('/notifications/unread_count'),
+  // 新通知推送（SSE），浏览器断线会自动带 Last-Event-ID 重连
+  openStream: () => new EventSource(`${api.defaults.baseURL}/notifications/stream`, { withCredentials: true }),
+  // 不支持 SSE 时的长轮询
+  poll: (lastEventId) => api.get('/notifications/poll', { params: { last_event_id: lastEventId }, timeout: 40000 }),
   markAsRead: (id) => api.post(`/notifications/${id}/read`),
   markAllAsRead: () => api.post('/notifications/read_all'),
   send: (data) => api.post('/notifications/send', data)
@@ -66,7 +71,11 @@ export const likesApi = {
   likePost: (postId) => api.post(`/posts/${postId}/like`),
   unlikePost: (postId) => api.delete(`/posts/${postId}/like`),
   likeComment: (commentId) => api.post(`/comments/${commentId}/like`),
-  unlikeComment: (commentId) => api.delete(`/comments/${commentId}/like`)
+  unlikeComment: (commentId) => api.delete(`/comments/${commentId}/like`),
+  // 批量查询点赞状态，返回 { posts: { id: bool }, comments: { id: bool } }
+  status: (postIds = [], commentIds = []) => api.get('/likes', {
+    params: { posts: postIds.join(','), comments: commentIds.join(',') }
+  })
 };
 
 export default api;